@@ -1,159 +1,245 @@
 #!/usr/bin/env python3
 
+import bisect
 import datetime
+import io
+import re
 import sys
+import threading
 from argparse import ArgumentParser
 from io import StringIO
 
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.graph_objs._figure
-from dash import Dash, dcc, html
+from dash import Dash, dcc, html, no_update
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from path import Path
 from plotly import express as px
 
+from downsample import PIXELS, m4_indices
+from live_ingest import LiveIngest
+from log_cache import CACHE_FOLDER, MAX_SIZE, ParsedLogCache
+from log_names import FORMAT_DATETIME, _dated_files, _read_file_dt
+from rollup import LEVELS, RollupStore, envelope
+from typed_arrays import (
+    CLIENTSIDE_DECODE,
+    epoch_ms,
+    extend_payload,
+    figure_payload,
+    write_html,
+)
+
 # Using Plotly as default plot for pandas
 pd.set_option("plotting.backend", "plotly")
 
-FORMAT_DATETIME = '%Y%m%d_%H%M%S'
-
 # dict of traces by name
 
-TRACES = [
-    # Timestamp_UTC; P[W]; Q[VAr]; U_L1L2[V]; U_L2L3[V]; U_L3L1[V]; I_L1[A]; I_L2[A]; I_L3[A]; f[Hz]; PMin[W]; PMax[W]; P_setYuso[W]; Q_setYuso[W]; P_setToTSC[W]; Q_setToTSC[W]; P_setReadback[W]; Q_setReadback[W]; E[Wh]; E_PMax[Wh]
-    dict(
-        column='f[Hz]',
-        ratio=1,
-        name='f[Hz]',
-        yaxis='y2',
-        color='lightgrey',
-        visible='legendonly',
-    ),
-    dict(
-        column='E[Wh]',
-        ratio=1e-6,
-        name='E[MWh]',
-        yaxis='y4',
-        color='firebrick',
-        dash='dash',
-    ),
-    dict(column='P[W]', ratio=1, name='P[W]', yaxis='y1', color='blue', dash='solid'),
-    dict(column='P[W]_2', ratio=1, name='P[W]', yaxis='y1', color='blue', dash=':'),
-    dict(
-        column='Q[VAr]',
-        ratio=1,
-        name='Q[VAr]',
-        yaxis='y1',
-        color='red',
-        dash='solid',
-    ),
-    dict(column='P_setToTSC[W]', ratio=1, name='P_setTSC', yaxis='y1'),
-    dict(column='Q_setToTSC[W]', ratio=1, name='Q_setTSC', yaxis='y1'),
-    dict(
-        column='P_setReadback[W]',
-        ratio=1,
-        name='P_set_FB',
-        yaxis='y1',
-        color='blue',
-    ),
-    dict(column='Q_setReadback[W]', ratio=1, name='Q_set_FB', yaxis='y1', color='red'),
-    dict(
-        column='U_avg',
-        ratio=0.001,
-        name='U_avg',
-        yaxis='y3',
-        color='green',
-        dash='solid',
-    ),
-    dict(
-        column='PMin[W]',
-        ratio=1000000,
-        name='PMin',
-        yaxis='y1',
-        legendgroup='G-Flex',
-    ),
-    dict(
-        column='PMax[W]',
-        ratio=1000000,
-        name='PMax',
-        yaxis='y1',
-        legendgroup='G-Flex',
-    ),
-] + [
-    # Timestamp_UTC; P[kW]; Q[kvar]; U_L1L2[V]; U_L2L3[V]; U_L3L1[V]; I_L1[A]; I_L2[A]; I_L3[A]; f[mHz]; PMin[kW]; PMax[kW]; P_set[kW]; Q_set[kW]; P_setToTSC[kW]; Q_setToTSC[kW]; P_setReadback[kW]; Q_setReadback[kW]; E[kWh]; E_PMax[kWh]; P_TSC[kW]; Q_TSC[kW]; Q(U) Inputs/Outputs:; 1;2;3;4;5;6
-    dict(
-        column='f[mHz]',
-        ratio=1000,
-        name='f[Hz]',
-        yaxis='y2',
-        color='lightgrey',
-        visible='legendonly',
-    ),
-    dict(
-        column='E[kWh]',
-        ratio=0.001,
-        name='E[MWh]',
-        yaxis='y4',
-        color='firebrick',
-        dash='dash',
-    ),
-    dict(
-        column='E_PMax[kWh]',
-        ratio=0.001,
-        name='E_Pmax[MWh]',
-        yaxis='y4',
-        color='black',
-        dash='dash',
-    ),
-    dict(
-        column='P[kW]', ratio=1000, name='P[W]', yaxis='y1', color='blue', dash='solid'
-    ),
-    dict(
-        column='Q[kvar]',
-        ratio=1000,
-        name='Q[VAr]',
-        yaxis='y1',
-        color='red',
-        dash='solid',
-    ),
-    dict(column='P_setToTSC[kW]', ratio=1000, name='P_setTSC', yaxis='y1'),
-    dict(column='Q_setToTSC[kW]', ratio=1000, name='Q_setTSC', yaxis='y1'),
-    dict(
-        column='P_setReadback[kW]',
-        ratio=1000,
-        name='P_set_FB',
-        yaxis='y1',
-        color='blue',
-    ),
-    dict(
-        column='Q_setReadback[kW]', ratio=1000, name='Q_set_FB', yaxis='y1', color='red'
-    ),
-    dict(
-        column='U_avg',
-        ratio=0.001,
-        name='U_avg',
-        yaxis='y3',
-        color='green',
-        dash='solid',
-    ),
-    dict(column='P_TSC[kW]', ratio=1000, name='P_TSC'),
-    dict(column='Q_TSC[kW]', ratio=1000, name='Q_TSC'),
-    dict(
-        column='PMin[kW]',
-        ratio=1000,
-        name='PMin',
-        yaxis='y1',
-        legendgroup='G-Flex',
-    ),
-    dict(
-        column='PMax[kW]',
-        ratio=1000,
-        name='PMax',
-        yaxis='y1',
-        legendgroup='G-Flex',
-    ),
-]
+TRACES = (
+    [
+        # Timestamp_UTC; P[W]; Q[VAr]; U_L1L2[V]; U_L2L3[V]; U_L3L1[V]; I_L1[A]; I_L2[A]; I_L3[A]; f[Hz]; PMin[W]; PMax[W]; P_setYuso[W]; Q_setYuso[W]; P_setToTSC[W]; Q_setToTSC[W]; P_setReadback[W]; Q_setReadback[W]; E[Wh]; E_PMax[Wh]
+        dict(
+            column='f[Hz]',
+            ratio=1,
+            name='f[Hz]',
+            yaxis='y2',
+            color='lightgrey',
+            visible='legendonly',
+        ),
+        dict(
+            column='E[Wh]',
+            ratio=1e-6,
+            name='E[MWh]',
+            yaxis='y4',
+            color='firebrick',
+            dash='dash',
+        ),
+        dict(
+            column='P[W]', ratio=1, name='P[W]', yaxis='y1', color='blue', dash='solid'
+        ),
+        dict(column='P[W]_2', ratio=1, name='P[W]', yaxis='y1', color='blue', dash=':'),
+        dict(
+            column='Q[VAr]',
+            ratio=1,
+            name='Q[VAr]',
+            yaxis='y1',
+            color='red',
+            dash='solid',
+        ),
+        dict(column='P_setToTSC[W]', ratio=1, name='P_setTSC', yaxis='y1'),
+        dict(column='Q_setToTSC[W]', ratio=1, name='Q_setTSC', yaxis='y1'),
+        dict(
+            column='P_setReadback[W]',
+            ratio=1,
+            name='P_set_FB',
+            yaxis='y1',
+            color='blue',
+        ),
+        dict(
+            column='Q_setReadback[W]', ratio=1, name='Q_set_FB', yaxis='y1', color='red'
+        ),
+        dict(
+            column='U_avg',
+            ratio=0.001,
+            name='U_avg',
+            yaxis='y3',
+            color='green',
+            dash='solid',
+        ),
+        dict(
+            column='PMin[W]',
+            ratio=1000000,
+            name='PMin',
+            yaxis='y1',
+            legendgroup='G-Flex',
+        ),
+        dict(
+            column='PMax[W]',
+            ratio=1000000,
+            name='PMax',
+            yaxis='y1',
+            legendgroup='G-Flex',
+        ),
+    ]
+    + [
+        # Timestamp_UTC; P[kW]; Q[kvar]; U_L1L2[V]; U_L2L3[V]; U_L3L1[V]; I_L1[A]; I_L2[A]; I_L3[A]; f[mHz]; PMin[kW]; PMax[kW]; P_set[kW]; Q_set[kW]; P_setToTSC[kW]; Q_setToTSC[kW]; P_setReadback[kW]; Q_setReadback[kW]; E[kWh]; E_PMax[kWh]; P_TSC[kW]; Q_TSC[kW]; Q(U) Inputs/Outputs:; 1;2;3;4;5;6
+        dict(
+            column='f[mHz]',
+            ratio=1000,
+            name='f[Hz]',
+            yaxis='y2',
+            color='lightgrey',
+            visible='legendonly',
+        ),
+        dict(
+            column='E[kWh]',
+            ratio=0.001,
+            name='E[MWh]',
+            yaxis='y4',
+            color='firebrick',
+            dash='dash',
+        ),
+        dict(
+            column='E_PMax[kWh]',
+            ratio=0.001,
+            name='E_Pmax[MWh]',
+            yaxis='y4',
+            color='black',
+            dash='dash',
+        ),
+        dict(
+            column='P[kW]',
+            ratio=1000,
+            name='P[W]',
+            yaxis='y1',
+            color='blue',
+            dash='solid',
+        ),
+        dict(
+            column='Q[kvar]',
+            ratio=1000,
+            name='Q[VAr]',
+            yaxis='y1',
+            color='red',
+            dash='solid',
+        ),
+        dict(column='P_setToTSC[kW]', ratio=1000, name='P_setTSC', yaxis='y1'),
+        dict(column='Q_setToTSC[kW]', ratio=1000, name='Q_setTSC', yaxis='y1'),
+        dict(
+            column='P_setReadback[kW]',
+            ratio=1000,
+            name='P_set_FB',
+            yaxis='y1',
+            color='blue',
+        ),
+        dict(
+            column='Q_setReadback[kW]',
+            ratio=1000,
+            name='Q_set_FB',
+            yaxis='y1',
+            color='red',
+        ),
+        dict(
+            column='U_avg',
+            ratio=0.001,
+            name='U_avg',
+            yaxis='y3',
+            color='green',
+            dash='solid',
+        ),
+        dict(column='P_TSC[kW]', ratio=1000, name='P_TSC'),
+        dict(column='Q_TSC[kW]', ratio=1000, name='Q_TSC'),
+        dict(
+            column='PMin[kW]',
+            ratio=1000,
+            name='PMin',
+            yaxis='y1',
+            legendgroup='G-Flex',
+        ),
+        dict(
+            column='PMax[kW]',
+            ratio=1000,
+            name='PMax',
+            yaxis='y1',
+            legendgroup='G-Flex',
+        ),
+    ]
+    + [
+        # Timestamp_UTC;energy_remaining;P_setpoint;Q_setpoint;P_up;P_down;Q_up;Q_down;Number_Available_Megapacks
+        # logged by TSC_poller, TSC_connector.ADDRESS registers in W, Wh and W/s
+        dict(
+            column='energy_remaining',
+            ratio=1e-6,
+            name='E_TSC[MWh]',
+            yaxis='y4',
+            color='firebrick',
+        ),
+        dict(column='P_setpoint', ratio=1, name='P_setpoint_TSC', yaxis='y1'),
+        dict(column='Q_setpoint', ratio=1, name='Q_setpoint_TSC', yaxis='y1'),
+        dict(
+            column='P_up',
+            ratio=1,
+            name='P_up[W/s]',
+            yaxis='y1',
+            visible='legendonly',
+            legendgroup='ramps',
+        ),
+        dict(
+            column='P_down',
+            ratio=1,
+            name='P_down[W/s]',
+            yaxis='y1',
+            visible='legendonly',
+            legendgroup='ramps',
+        ),
+        dict(
+            column='Q_up',
+            ratio=1,
+            name='Q_up[VAr/s]',
+            yaxis='y1',
+            visible='legendonly',
+            legendgroup='ramps',
+        ),
+        dict(
+            column='Q_down',
+            ratio=1,
+            name='Q_down[VAr/s]',
+            yaxis='y1',
+            visible='legendonly',
+            legendgroup='ramps',
+        ),
+        dict(
+            column='Number_Available_Megapacks',
+            ratio=1,
+            name='Megapacks',
+            yaxis='y2',
+            color='lightgrey',
+            visible='legendonly',
+        ),
+    ]
+)
 COLORS = dict(
     P='blue', Q='red', P_TSC='cyan', Q_TSC='orange', U='green'  # , MWh='firebrick'
 )
@@ -162,56 +248,129 @@ WIDTH = dict(Min=1, Max=1, MWh=2)
 
 LINES_PARAM = ['color', 'dash', 'width']
 
-FREQ_RESAMPLE = '10S'  # resampling frequency or None 'L' for milliseconds
+# resampling frequency or None 'L' for milliseconds, 'auto' for the finest
+# rollup level fitting the whole data
+FREQ_RESAMPLE = '10S'
 freq_update = 6  # seconds
 
 detail_duration_minutes = 5
 
+RAW_POINTS = 200000  # max raw rows of a zoomed window, else read in the rollups
 
-def prepare_data_dict(data, traces_par: list = TRACES):
-    cols = data.columns
-    traces = {}
-    for trace_p in traces_par:
-        trace_p = trace_p.copy()
+COLUMNAR_EXT = ['.parquet', '.arrows']  # files written by read_telnet --ingest
 
-        line_par = [k for k in trace_p if k in LINES_PARAM]
-        line_par = dict((k, trace_p.pop(k)) for k in line_par)
-        if trace_p['column'] in cols:
+PARSER_VERSION = 2  # to increase when the processed data changes, for the cache
+
+
+class TracePlan:
+    """
+    Trace parameters compiled once for the columns of a DataFrame: traces of
+    missing columns dropped and line styles resolved. Each call then scales all
+    the selected columns with a single numpy operation. When they are
+    downsampled, into an output buffer reused by the following calls of the same
+    thread, only the points kept being copied out.
+    """
+
+    def __init__(self, columns, traces_par: list = TRACES):
+        self.columns = tuple(columns)
+        # kept referenced: the plans are found by the id of the list
+        self.traces_par = traces_par
+        specs = dict()  # by name, the last trace of a name kept
+        for trace_p in traces_par:
+            if trace_p['column'] not in self.columns:
+                continue
+            trace_p = trace_p.copy()
+            line_par = dict((k, trace_p.pop(k)) for k in LINES_PARAM if k in trace_p)
             name = trace_p['name']
             ratio = trace_p.pop('ratio') if 'ratio' in trace_p else 1
             col = trace_p.pop('column')
             yaxis = trace_p.pop('yaxis') if 'yaxis' in trace_p else 'y1'
-            traces[name] = dict(
-                x=data.index,
-                y=data[col].values * ratio,
-                yaxis=yaxis,
-                **trace_p,
-                line=line_par,
-            )
+            for styles, param in [(COLORS, 'color'), (DASH, 'dash'), (WIDTH, 'width')]:
+                for leg in styles:
+                    if leg in name:
+                        line_par[param] = styles[leg]
+            specs[name] = (col, ratio, dict(yaxis=yaxis, **trace_p, line=line_par))
+
+        self.names = list(specs)
+        self.positions = np.array(
+            [self.columns.index(col) for col, ratio, par in specs.values()], dtype=int
+        )
+        self.ratios = np.array(
+            [ratio for col, ratio, par in specs.values()], dtype=float
+        )
+        self.parameters = [par for col, ratio, par in specs.values()]
+        self._local = threading.local()
+
+    def _buffer(self, nb_rows):
+        """Output buffer of at least `nb_rows` columns, one row per trace"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[1] < nb_rows:
+            buffer = np.empty((len(self.names), nb_rows))
+            self._local.buffer = buffer
+        return buffer[:, :nb_rows]
+
+    def scale(self, data, out=None):
+        """
+        Scaled values of the traces, one row per trace
+        :param out: array of the result, by default the buffer of the thread,
+                    valid until its next call
+        """
+        if tuple(data.columns) != self.columns:
+            raise ValueError("Columns of the data are not the ones of the plan")
+        # only the columns of the traces converted, one row per trace
+        values = data.iloc[:, self.positions].to_numpy(dtype=float).T
+        out = self._buffer(len(data)) if out is None else out
+        np.multiply(values, self.ratios[:, None], out=out)
+        return out
+
+    def traces(self, data, pixels=PIXELS):
+        """dict of the traces parameters by name, as `prepare_data_dict`"""
+        index = data.index
+        downsampled = pixels and len(data) > 4 * pixels
+        if downsampled:
+            # only the points kept are copied out of the buffer
+            scaled = self.scale(data)
+        else:
+            scaled = self.scale(data, np.empty((len(self.names), len(data))))
+        # datetime64 values of the index, converted once for all traces
+        times = index.values
+        traces = dict()
+        for name, y, parameters in zip(self.names, scaled, self.parameters):
+            x = index
+            if downsampled:
+                kept = m4_indices(times, y, pixels)
+                x, y = index[kept], y[kept]
+            traces[name] = dict(x=x, y=y, **parameters)
+        return traces
 
-            trace = traces[name]
-            for leg in COLORS:
-                if leg in name:
-                    trace['line'].update(dict(color=COLORS[leg]))
-            for leg in DASH:
-                if leg in name:
-                    trace['line'].update(dict(dash=DASH[leg]))
-            for leg in WIDTH:
-                if leg in name:
-                    trace['line'].update(dict(width=WIDTH[leg]))
 
-    return traces
+_trace_plans = dict()  # by columns and traces parameters
 
 
-def _read_file_dt(filename):
-    return datetime.datetime.strptime(
-        Path(filename).stem.split('-')[0], FORMAT_DATETIME
-    )
+def trace_plan(columns, traces_par: list = TRACES):
+    """TracePlan of `columns`, compiled on the first use"""
+    key = (tuple(columns), id(traces_par))
+    if key not in _trace_plans:
+        _trace_plans[key] = TracePlan(columns, traces_par)
+    return _trace_plans[key]
+
+
+def prepare_data_dict(data, traces_par: list = TRACES, pixels=PIXELS):
+    """
+    :param pixels: points budget per trace, kept by M4 downsampling with the
+                   peaks of the data, None to keep all points
+    """
+    return trace_plan(data.columns, traces_par).traces(data, pixels)
+
+
+def _log_suffix(file):
+    """File name without its date, e.g. 'AWC1.log'"""
+    return re.sub(r'^[\d_-]+', '', Path(file).basename())
 
 
 def search_last_file_content(folder, pattern='*AWC*.log', replace_semicolon=False):
     # folder /= '20221017'
-    files = list(folder.walk(pattern))
+    files = _dated_files(folder.walk(pattern))
     files.sort(key=_read_file_dt)
 
     file = files[-1]
@@ -229,10 +388,107 @@ def search_last_file_content(folder, pattern='*AWC*.log', replace_semicolon=Fals
     return file_content
 
 
-def read_data(file_content, skip_lines=0, file2=None):
-    data = read_file_data(file_content, skip_lines)
+def select_files(folder, start=None, end=None, pattern='*AWC*.log'):
+    """
+    Files of a single AWC with data between the naive UTC datetimes `start`
+    and `end`, from the dates in their names: each file spans until the date
+    of the next one. Files of the folder and its subfolders, the names not
+    starting with a date skipped.
+    """
+    files = sorted(_dated_files(Path(folder).walk(pattern)), key=_read_file_dt)
+    suffixes = sorted(set(_log_suffix(f) for f in files))
+    if len(suffixes) > 1:
+        raise ValueError(
+            f"Pattern {pattern} selects the files of several AWCs: {suffixes}"
+        )
+
+    dates = [_read_file_dt(f) for f in files]
+    first = max(bisect.bisect_right(dates, start) - 1, 0) if start else 0
+    last = bisect.bisect_right(dates, end) if end else len(files)
+    return files[first:last]
+
+
+def _local_time(value):
+    """Europe/Paris timestamp of a FORMAT_DATETIME or ISO string, None if not set"""
+    if not value:
+        return None
+    # without the seconds first, '%S' would take the last digits of the minutes
+    for date_fmt in [FORMAT_DATETIME[:-2], FORMAT_DATETIME]:
+        try:
+            value = datetime.datetime.strptime(value, date_fmt)
+        except (TypeError, ValueError):
+            continue
+        break
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize('Europe/Paris')
+    return value.tz_convert('Europe/Paris')
+
+
+def read_range(
+    folder,
+    start=None,
+    end=None,
+    pattern='*AWC*.log',
+    engine='pandas',
+    cache=None,
+    workers=None,
+):
+    """
+    Continuous data of the rotated files of one AWC between `start` and `end`,
+    local times or strings of FORMAT_DATETIME, both optional.
+    Files are parsed in parallel, and lines present in two files kept once.
+    """
+    start, end = _local_time(start), _local_time(end)
+    files = select_files(
+        folder,
+        *[
+            dt.tz_convert('UTC').tz_localize(None) if dt is not None else None
+            for dt in (start, end)
+        ],
+        pattern=pattern,
+    )
+    if not files:
+        raise FileNotFoundError(f"No file {pattern} from {start} to {end} in {folder}")
+    print(f"Reading {len(files)} files from {files[0]} to {files[-1]}")
+
+    data = read_files(files, engine=engine, cache=cache, workers=workers)
+    data = data[~data.index.duplicated(keep='last')]
+    return data.loc[start:end]
+
+
+def _next_log_file(file):
+    """Next file of the same AWC (same name after the date), if already created"""
+    # folder of a bare file name is '', not the current folder
+    file = Path(file).abspath()
+    suffix = _log_suffix(file)
+    files = sorted(
+        f for f in file.parent.listdir('*' + suffix) if f.basename() > file.basename()
+    )
+    if files:
+        return files[0]
+
+
+def _rotated_files(files):
+    """
+    Files of `files` with a next file of the same AWC: the last file of each AWC
+    in the list is the only one looked up in its folder
+    """
+    last = dict()  # by folder and name after the date
+    for file in files:
+        key = (Path(file).abspath().parent, _log_suffix(file))
+        if key not in last or Path(file).basename() > Path(last[key]).basename():
+            last[key] = file
+    last = set(last.values())
+    return set(file for file in files if file not in last or _next_log_file(file))
+
+
+def read_data(
+    file_content, skip_lines=0, file2=None, engine='pandas', cache=None, workers=None
+):
+    data = read_file_data(file_content, skip_lines, engine, cache, workers)
     if file2:
-        data2 = read_file_data(file2, skip_lines)
+        data2 = read_file_data(file2, skip_lines, engine, cache, workers)
         data2.columns = data2.columns + '_2'
         data = pd.concat(
             [data.resample('1S').mean(), data2.resample('1S').mean()], axis=1
@@ -241,10 +497,79 @@ def read_data(file_content, skip_lines=0, file2=None):
     return data
 
 
-def read_file_data(file_content, skip_lines=0):
+def read_files(
+    files, skip_lines=0, engine='pandas', cache=None, workers=None, dtype='float64'
+):
+    """
+    Data of all `files` merged in time order. Files not in the cache are parsed
+    in a pool of `workers` processes (all CPUs by default), their data sent back
+    as Arrow buffers in shared memory.
+    """
+    # optional dependency, only needed for several files
+    from parallel_read import merge, parse_files
+
+    frames = dict()
+    # files still written are not cached
+    rotated = _rotated_files(files) if cache is not None else set()
+    for file in rotated:
+        data = cache.load(file, engine, dtype)
+        if data is not None:
+            frames[file] = data
+    to_parse = [file for file in files if file not in frames]
+    parsed = parse_files(to_parse, engine, workers, dtype)
+    for file, data in zip(to_parse, parsed):
+        if file in rotated:
+            cache.store(file, data, engine, dtype)
+        frames[file] = data
+    return merge([frames[file] for file in files]).iloc[skip_lines:]
+
+
+def read_file_data(
+    file_content,
+    skip_lines=0,
+    engine='pandas',
+    cache=None,
+    workers=None,
+    dtype='float64',
+):
+    """
+    :param file_content: file path or content, or list of file paths read with
+                         `read_files`
+    :param engine: 'pandas' to parse with pd.read_csv, 'arrow' to parse the
+                   memory-mapped file with pyarrow (file path only)
+    :param cache: log_cache.ParsedLogCache of the rotated files, the file still
+                  written is always parsed
+    :param workers: number of processes parsing a list of files
+    :param dtype: 'float64' or 'float32' for the values of the 'arrow' engine
+    """
+    if isinstance(file_content, (list, tuple)):
+        return read_files(file_content, skip_lines, engine, cache, workers, dtype)
+    if cache is not None and isinstance(file_content, str):
+        if _next_log_file(file_content):
+            data = cache.get(
+                file_content,
+                lambda file: read_file_data(file, engine=engine, dtype=dtype),
+                engine,
+                dtype,
+            )
+            return data.iloc[skip_lines:]
+    if isinstance(file_content, str) and Path(file_content).ext in COLUMNAR_EXT:
+        # written already parsed by read_telnet, with UTC timestamps
+        from columnar_writer import read_columnar
+
+        data = read_columnar(file_content).iloc[skip_lines:]
+        return _process_data(data)
+    if engine == 'arrow' and isinstance(file_content, str):
+        data = read_file_mmap(file_content, dtype).iloc[skip_lines:]
+        return _process_data(data)
+
     line_headers = 0
-    with file.open() as f:
-        line1 = f.readline()
+    if isinstance(file_content, str):
+        with open(file_content) as f:
+            line1 = f.readline()
+    else:
+        line1 = file_content.readline()
+        file_content.seek(0)
     if 'putty' in line1.lower():
         line_headers = 1
 
@@ -265,17 +590,185 @@ def read_file_data(file_content, skip_lines=0):
     )
 
     data.columns = data.columns.str.replace(' ', '')
+    return _process_data(data.tz_localize('UTC'))
+
+
+def read_file_mmap(file, dtype='float64'):
+    """
+    Parse a log file memory-mapped, with the multi-threaded pyarrow CSV reader.
+    The trailing ';' of the older format only gives an empty column, dropped
+    without copying the file content.
+    :param dtype: 'float64' or 'float32' for the values
+    :return: data indexed by UTC time
+    """
+    # optional dependency, only needed for this engine
+    import pyarrow as pa
+    from pyarrow import csv
+
+    from columnar_writer import _date_format
+
+    line_headers = 0
+    with open(file) as f:
+        header = f.readline()
+        if 'putty' in header.lower():
+            line_headers = 1
+            header = f.readline()
+    columns = header.rstrip('\n').split(';')
+
+    read_options = csv.ReadOptions(skip_rows=line_headers)
+    parse_options = csv.ParseOptions(delimiter=';')
+    column_types = dict((c, getattr(pa, dtype)()) for c in columns[1:] if c.strip())
+    with pa.memory_map(file) as source:
+        try:
+            table = csv.read_csv(
+                source,
+                read_options=read_options,
+                parse_options=parse_options,
+                convert_options=csv.ConvertOptions(
+                    column_types=column_types, null_values=['', ' ']
+                ),
+            )
+        except pa.ArrowInvalid:
+            # some values are not numbers, letting pyarrow infer the types
+            source.seek(0)
+            table = csv.read_csv(
+                source, read_options=read_options, parse_options=parse_options
+            )
+    table = table.select([c for c in table.column_names if c.strip()])
+
+    times = table.column(0).to_pandas().str.strip()
+    index = pd.to_datetime(
+        times, format=_date_format(times.iloc[0]), dayfirst=True, errors='coerce'
+    )
+    # columns handed over to pandas without a second copy
+    table = table.drop([columns[0]])
+    data = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    data.index = pd.DatetimeIndex(index, name=columns[0])
+    data.columns = data.columns.str.replace(' ', '')
+    return data.tz_localize('UTC')
 
-    # Calculate average Voltage
-    data['U_avg'] = data[[c for c in data.columns if 'U_L' in c]].mean(axis=1)
-    data = data.tz_localize('UTC').tz_convert('Europe/Paris')
+
+def _process_data(data):
+    """Columns computed from the AWC data, and local time index"""
+    # Calculate average Voltage, not in the TSC logs
+    voltages = [c for c in data.columns if 'U_L' in c]
+    if voltages:
+        data['U_avg'] = data[voltages].mean(axis=1)
+    data = data.tz_convert('Europe/Paris')
 
     data.index.name = 'Time (CET)'
     return data
 
 
-def update_figure(fig, data):
-    traces = prepare_data_dict(data)
+class LogTail:
+    """
+    Incremental reader of a growing AWC log file: each reading only parses the
+    bytes appended since the previous one. When the file has been rotated, the
+    next file of the same AWC (same name after the date) is followed.
+    """
+
+    def __init__(self, file):
+        self._open(file)
+
+    def _open(self, file):
+        self.file = Path(file)
+        self.offset = 0
+        self.columns = None
+        self._partial = b''
+
+    def _read_header(self, f):
+        line = f.readline()
+        if 'putty' in line.decode(errors='replace').lower():
+            line = f.readline()
+        if not line.endswith(b'\n'):
+            return False  # header not complete yet
+        # trailing ';' of the older format gives unnamed columns
+        self.columns = [
+            c.strip() or f'_unnamed{i}'
+            for i, c in enumerate(line.decode().rstrip('\r\n').split(';'))
+        ]
+        self.offset = f.tell()
+        return True
+
+    def _read_new(self):
+        """Data of the complete lines appended since the last reading"""
+        with self.file.open('rb') as f:
+            f.seek(0, io.SEEK_END)
+            if f.tell() < self.offset:
+                print(f"File {self.file} truncated, reading it again.")
+                self._open(self.file)
+            if self.columns is None:
+                f.seek(0)
+                if not self._read_header(f):
+                    return None
+            f.seek(self.offset)
+            chunk = f.read()
+        self.offset += len(chunk)
+
+        chunk = self._partial + chunk
+        end = chunk.rfind(b'\n') + 1
+        self._partial = chunk[end:]
+        if not end:
+            return None
+
+        data = pd.read_csv(
+            io.BytesIO(chunk[:end]),
+            sep=';',
+            header=None,
+            names=self.columns,
+            decimal='.',
+            parse_dates=True,
+            index_col=0,
+            dayfirst=True,
+        )
+        data = data[[c for c in data.columns if not c.startswith('_unnamed')]]
+        data.columns = data.columns.str.replace(' ', '')
+        return data
+
+    def _next_file(self):
+        return _next_log_file(self.file)
+
+    def read(self):
+        """Data appended since the last reading, from the following files as well"""
+        frames = [self._read_new()]
+        next_file = self._next_file()
+        while next_file:
+            # current file is complete once the next one exists
+            frames.append(self._read_new())
+            print(f"Following file {next_file}")
+            self._open(next_file)
+            frames.append(self._read_new())
+            next_file = self._next_file()
+
+        frames = [f for f in frames if f is not None]
+        if not frames:
+            return pd.DataFrame(
+                columns=[c for c in self.columns or [] if not c.startswith('_unnamed')]
+            )
+        data = pd.concat(frames) if len(frames) > 1 else frames[0]
+        return _process_data(data.tz_localize('UTC'))
+
+
+def binary_traces(traces):
+    """
+    Traces with x as epoch ms and y as float32, encoded as typed arrays by
+    typed_arrays; the x of the traces sharing an index converted once
+    """
+    times = dict()  # by id of the x index
+    for trace in traces.values():
+        x = trace['x']
+        if id(x) not in times:
+            times[id(x)] = (x, epoch_ms(x))
+        trace['x'] = times[id(x)][1]
+        trace['y'] = trace['y'].astype('float32')
+    return traces
+
+
+def update_figure(fig, data, pixels=PIXELS, binary=True):
+    traces = prepare_data_dict(data, pixels=pixels)
+    if binary:
+        traces = binary_traces(traces)
     if isinstance(fig, plotly.graph_objs._figure.Figure):
         with fig.batch_update():
             for data_i in fig['data']:
@@ -288,18 +781,45 @@ def update_figure(fig, data):
             data_i['y'] = traces[data_i['name']]['y']
 
 
-def plot_df(data, slider=False, traces_dict=TRACES):
+def extend_data(trace_names, data, max_points=None, binary=True):
+    """
+    `extendData` of a dcc.Graph of traces `trace_names` with the rows of `data`,
+    only the new points sent to the browser
+    :param max_points: points kept per trace, the oldest ones dropped
+    :param binary: payload of typed arrays, decoded by CLIENTSIDE_DECODE
+    """
+    traces = prepare_data_dict(data, pixels=None)
+    indices = [i for i, name in enumerate(trace_names) if name in traces]
+    update = dict(
+        x=[traces[trace_names[i]]['x'] for i in indices],
+        y=[traces[trace_names[i]]['y'] for i in indices],
+    )
+    if binary:
+        return extend_payload(update, indices, max_points)
+    if max_points:
+        return [update, indices, max_points]
+    return [update, indices]
+
+
+def plot_df(data, slider=False, traces_dict=TRACES, pixels=PIXELS, binary=True):
+    """
+    :param binary: x as epoch ms and y as float32, to be written as typed
+                   arrays by typed_arrays
+    """
 
     # Simple time plot
     figure: plotly.graph_objs._figure.Figure = plotly.tools.make_subplots()
 
-    traces = prepare_data_dict(data, traces_dict)
+    traces = prepare_data_dict(data, traces_dict, pixels)
+    if binary:
+        traces = binary_traces(traces)
     for t in traces.values():
         figure.add_trace(go.Scatter(**t))
 
     figure.update_layout(
         margin=dict(l=0, r=0, b=0, t=0),
-        xaxis=dict(domain=[0.05, 0.95]),
+        # epoch ms of the binary traces shown as dates
+        xaxis=dict(domain=[0.05, 0.95], type='date'),
         yaxis=dict(
             title="Power(W)",
             # titlefont=dict(
@@ -371,6 +891,71 @@ def plot_df(data, slider=False, traces_dict=TRACES):
     return figure
 
 
+def resample_data(rollup: RollupStore, data, freq):
+    """
+    Data of the overview plot: the min and max rows of the buckets of a rollup
+    level, `freq` being one of them or 'auto' for the finest one fitting the
+    whole data, else of `data` resampled at `freq`. Unlike the means, they keep
+    the peaks of the raw rows for the M4 downsampling of the traces.
+    """
+    if freq == 'auto':
+        freq = rollup.level_for()
+    if freq in rollup.levels:
+        return rollup.get(freq, 'envelope')
+    resampler = data.select_dtypes('number').resample(freq)
+    return envelope(resampler.min(), resampler.max())
+
+
+def relayout_range(relayout, tz='Europe/Paris'):
+    """
+    Visible x range of a graph `relayoutData`: (start, end) timestamps in `tz`,
+    (None, None) when zoomed out, None if the x axis did not change
+    """
+    if not relayout:
+        return None
+    if relayout.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout:
+        window = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    elif 'xaxis.range' in relayout:
+        window = relayout['xaxis.range']
+    else:
+        return None
+    # plotly ranges are the wall times of the data, without time zone
+    return tuple(pd.Timestamp(t).tz_localize(tz) for t in window)
+
+
+def query_window(rollup: RollupStore, data, start=None, end=None):
+    """
+    Data between `start` and `end` at the best resolution: the raw rows if at
+    most RAW_POINTS, else the min and max rows of the finest rollup level within
+    that budget
+    """
+    raw = data.loc[start:end]
+    if len(raw) <= RAW_POINTS:
+        return raw
+    level = rollup.level_for(start, end, RAW_POINTS // 2)
+    window = rollup.get(level, 'envelope', start=start, end=end)
+    return window if len(window) else raw
+
+
+def new_buckets(data, after=None):
+    """
+    Rows of resampled `data` after `after`, without the ones of the last bucket
+    still growing
+    """
+    if after is not None:
+        data = data[data.index > after]
+    if not len(data):
+        return data
+    return data[data.index < data.index[-1]]
+
+
+def _sample_period(data):
+    """Median time between rows"""
+    return data.index.to_series().diff().median()
+
+
 def select_last_data(data, minutes=5):
     # date_detail = '20221014_152300'
     # start = datetime.datetime.strptime(date_detail, '%Y%m%d_%H%M%S')
@@ -382,12 +967,30 @@ def select_last_data(data, minutes=5):
     return data[(data.index >= start) & (data.index <= end)]
 
 
-def make_app_store(name, figure, fig_detail):
+def make_app_store(name, figure, fig_detail, sent=None):
+    """
+    The figures and their extendData are sent as typed arrays payloads to the
+    stores '<graph id>_figure' and '<graph id>_extend', decoded in the browser
+    into the properties of the graph.
+    :param sent: initial data of the 'sent' store, what each browser has
+                 received of the live data
+    The 'view' store holds the x range of the overview when zoomed in, and the
+    last overview bucket of the view sent.
+    """
     app = Dash(name)
+    graphs = dict(graph_detail=fig_detail, graph_all=figure)
+    children = []
+    for graph_id, fig in graphs.items():
+        children += [
+            dcc.Graph(id=graph_id),
+            dcc.Store(id=graph_id + '_figure', data=figure_payload(fig)),
+            dcc.Store(id=graph_id + '_extend'),
+        ]
     app.layout = html.Div(
-        children=[
-            dcc.Graph(id='graph_detail', figure=fig_detail),
-            dcc.Graph(id='graph_all', figure=figure),
+        children=children
+        + [
+            dcc.Store(id='sent', data=sent),
+            dcc.Store(id='view'),
             dcc.Interval(
                 id='interval-component',
                 interval=freq_update * 1000,  # in milliseconds
@@ -395,6 +998,18 @@ def make_app_store(name, figure, fig_detail):
             ),
         ]
     )
+    for graph_id in graphs:
+        app.clientside_callback(
+            CLIENTSIDE_DECODE,
+            Output(graph_id, 'figure'),
+            Input(graph_id + '_figure', 'data'),
+        )
+        app.clientside_callback(
+            CLIENTSIDE_DECODE,
+            Output(graph_id, 'extendData'),
+            Input(graph_id + '_extend', 'data'),
+            prevent_initial_call=True,
+        )
     return app
 
 
@@ -462,7 +1077,68 @@ def parse_args(args=[]):
         action="store",
         default=FREQ_RESAMPLE,
         const=None,
-        help=f"Frequency to resample data. If not set, resample to {FREQ_RESAMPLE}, if no argument, no resample",
+        help=f"Frequency to resample data, rollup levels {LEVELS} are precomputed, 'auto' for the finest one fitting the whole data. If not set, resample to {FREQ_RESAMPLE}, if no argument, no resample",
+    )
+    parser.add_argument(
+        "--pixels",
+        dest='pixels',
+        type=int,
+        default=PIXELS,
+        help="Maximum points per trace, downsampled keeping the peaks, 0 to plot all points",
+    )
+    parser.add_argument(
+        "--engine",
+        "-e",
+        dest='engine',
+        choices=['pandas', 'arrow'],
+        default='pandas',
+        help="Parser of the log files, 'arrow' for large files",
+    )
+    parser.add_argument(
+        "--from",
+        dest='start',
+        default=None,
+        help=f"Start of the data to read from all files, local time as {FORMAT_DATETIME} or ISO",
+    )
+    parser.add_argument(
+        "--to",
+        dest='end',
+        default=None,
+        help=f"End of the data to read from all files, local time as {FORMAT_DATETIME} or ISO",
+    )
+    parser.add_argument(
+        "--awc",
+        dest='awc',
+        default='*',
+        help="Number of the AWC to read with --from/--to, if several in the folder",
+    )
+    parser.add_argument(
+        "--workers",
+        dest='workers',
+        type=int,
+        default=None,
+        help="Number of processes parsing several files, all CPUs if not set",
+    )
+    parser.add_argument(
+        "--cache_size",
+        dest='cache_size',
+        type=float,
+        default=MAX_SIZE / 1e6,
+        help=f"Size in MB of the parsed files cache in {CACHE_FOLDER}, 0 to disable it",
+    )
+    parser.add_argument(
+        "--clear_cache",
+        dest='clear_cache',
+        action="store_true",
+        default=None,
+        help="Clear the parsed files cache before reading",
+    )
+    parser.add_argument(
+        "--json_arrays",
+        dest='binary',
+        action="store_false",
+        default=True,
+        help="Writes the html files with the data as JSON lists, instead of typed arrays",
     )
     parser.add_argument(
         "--compare",
@@ -483,6 +1159,11 @@ def parse_args(args=[]):
         print(
             "Argument 'compare' require to set argument 'file' as input as well. option 'compare' is ignored"
         )
+    if (args.start or args.end) and args.update:
+        print(
+            "Arguments 'from' and 'to' select closed data, option 'update' is ignored"
+        )
+        args.update = None
     return args
 
 
@@ -564,6 +1245,13 @@ def plot_P_compare(data):
 if __name__ == '__main__':
     folder = Path(r'C:\Users\MLevy\Documents\2Acren')
 
+    if sys.argv[1:2] == ['report']:
+        # batch of files, rendered by a process pool in a single invocation
+        import report
+
+        report.main(sys.argv[2:])
+        sys.exit()
+
     args = parse_args(sys.argv)
 
     file2 = None
@@ -577,9 +1265,36 @@ if __name__ == '__main__':
     else:
         file = search_last_file_content(folder)
 
+    cache = None
+    if args.cache_size:
+        cache = ParsedLogCache(max_size=args.cache_size * 1e6, version=PARSER_VERSION)
+        if args.clear_cache:
+            cache.clear()
+
     print(f"# Reading file {file} #")
     now = datetime.datetime.now()
-    data = read_data(file, int(args.skip), file2)
+    tail = None
+    if args.start or args.end:
+        data = read_range(
+            folder,
+            args.start,
+            args.end,
+            pattern=f'*AWC{args.awc}.log',
+            engine=args.engine,
+            cache=cache,
+            workers=args.workers,
+        )
+        # name of the plots of the range
+        file = folder / (
+            f"{data.index[0]:{FORMAT_DATETIME}}-{data.index[-1]:{FORMAT_DATETIME}}"
+            f"_AWC{args.awc.replace('*', '')}.log"
+        )
+    elif args.update and not file2:
+        # following the file from its start
+        tail = LogTail(file)
+        data = tail.read().iloc[int(args.skip) :]
+    else:
+        data = read_data(file, int(args.skip), file2, args.engine, cache, args.workers)
     nb_lines_read = len(data)
     print(
         f"-> {nb_lines_read} lines read in {(datetime.datetime.now() - now).total_seconds()} seconds."
@@ -592,11 +1307,18 @@ if __name__ == '__main__':
         print(data)
 
     freq_resample = args.resample
+    rollup = RollupStore()
+    rollup.update(data)
     if freq_resample:
-        data_resample = data.resample(freq_resample).mean()
+        data_resample = resample_data(rollup, data, freq_resample)
     else:
         data_resample = data.copy()
-    figure = plot_df(data_resample, slider=True)
+    figure = plot_df(
+        data_resample,
+        slider=True,
+        pixels=args.pixels,
+        binary=args.binary or args.update,
+    )
     plot_all_resample = False
 
     detail_plot = True
@@ -605,18 +1327,28 @@ if __name__ == '__main__':
     if args.detail or args.update:
         name = file.stem + '_detail'
         data_detail = select_last_data(data, detail_duration_minutes)
-        figure_detail = plot_df(data_detail, slider=bool(args.file))
+        figure_detail = plot_df(
+            data_detail,
+            slider=bool(args.file),
+            pixels=args.pixels,
+            binary=args.binary or args.update,
+        )
 
     figure.update_layout(title=file.stem)
     if args.detail:
         figure_detail.update_layout(title=file.stem + '_detail')
 
     if args.write:
-        figure.write_html(file.replace(file.ext, '.html'))
-        if args.detail:
-            figure_detail.write_html(
-                file.replace(file.ext, '_detail.html')
-            )  # , fileopt='extend'
+        if args.binary:
+            write_html(figure, file.replace(file.ext, '.html'))
+            if args.detail:
+                write_html(figure_detail, file.replace(file.ext, '_detail.html'))
+        else:
+            figure.write_html(file.replace(file.ext, '.html'))
+            if args.detail:
+                figure_detail.write_html(
+                    file.replace(file.ext, '_detail.html')
+                )  # , fileopt='extend'
 
     if args.plot:
         figure.show()
@@ -624,85 +1356,142 @@ if __name__ == '__main__':
             figure_detail.show()
 
     if args.update:  # and not args.file:
-        update_running = False
-        app = make_app_store(name, figure, figure_detail)
+        if tail is None:
+            # following the file from its current end
+            tail = LogTail(file)
+            tail.read()
+        if freq_resample == 'auto':
+            # level fixed while running, the points sent being appended
+            freq_resample = rollup.level_for()
+        # rows of the detail window at the logging rate
+        detail_points = int(
+            pd.Timedelta(minutes=detail_duration_minutes) / _sample_period(data)
+        )
+        ingest = LiveIngest(
+            tail.read,
+            data,
+            rollup,
+            detail_points,
+            freq_resample,
+            period=freq_update,
+        )
+        # traces and layout of the overview, the points replaced by each view.
+        # Kept by the server: the figure of the browser, of typed arrays, is
+        # not sent back. The legend and zoom states are kept by uirevision.
+        overview = figure.update_layout(uirevision=name).to_plotly_json()
+
+        snapshot = ingest.snapshot
+        app = make_app_store(
+            name,
+            figure,
+            figure_detail,
+            sent=dict(
+                version=snapshot.version,
+                detail=str(snapshot.detail.index[-1]),
+                # last overview bucket, not sent again even if it was still growing
+                overview=str(snapshot.overview.end),
+            ),
+        )
+
+        detail_names = [t.name for t in figure_detail.data]
+        overview_names = [t.name for t in figure.data]
 
         @app.callback(
-            Output('graph_detail', 'figure'),
-            Output('graph_all', 'figure'),
-            # Output('data_store', 'data'),
+            Output('graph_detail_extend', 'data'),
+            Output('graph_all_extend', 'data'),
+            Output('sent', 'data'),
             Input('interval-component', 'n_intervals'),
-            Input('graph_detail', 'figure'),
-            Input('graph_all', 'figure'),
+            State('sent', 'data'),
+            State('view', 'data'),
         )
-        def update_graph_detail(
-            n,
-            figure_detail,
-            figure,
-        ):
-            global update_running
-            global file
-            global nb_lines_read
-            global data_detail
-            global data_resample
-            global freq_resample
-
-            # global figure, figure_detail
-
-            # if n <= 30 / freq_update:
-            #     print(f"#### No update at startup.")
-            #     return figure_detail, figure
-            if not update_running:
-                update_running = True
-                try:
-                    # data = pd.read_json(data, dtype=float)
-                    # print(f"data length:\n{len(data)}")
-                    start = datetime.datetime.now()
-                    data_new = read_file_data(file, skip_lines=nb_lines_read)
-                    stop = datetime.datetime.now()
-                    print(
-                        f"{len(data_new)} lines read, {nb_lines_read} skipped in {(stop - start).total_seconds()} seconds."
-                    )
-                    nb_lines_read += len(data_new)
-                    # print(f"start :{start}")
-                    # print(f"stop :{stop}")
-
-                    if len(data_new) > 0:
-                        data_detail = select_last_data(
-                            data_detail, detail_duration_minutes
-                        )
-                        data_detail = pd.concat(
-                            [data_detail, data_new]
-                        )  # .drop_duplicates()
-                        # print(f"data_detail columns:\n{data_detail.columns}")
-
-                        update_figure(figure_detail, data_detail)
-                        # figure_detail = plot_df(data_detail)
-
-                        data_resample_new = data_new.resample(freq_resample).mean()
-                        data_resample = pd.concat([data_resample, data_resample_new])
-                        data_resample = data_resample.groupby(
-                            data_resample.index
-                        ).last()
-                        # print(f"data_resample columns:\n{data_resample.columns}")
-
-                        update_figure(figure, data_resample)
-                        # figure= plot_df(data_resample)
-
-                        # print(figure)
-                        stop = datetime.datetime.now()
-                        print(
-                            f"Fig updated in {(stop - start).total_seconds()} seconds."
-                        )
-                except Exception as err:
-                    print(f"Error updating: {err}")
-                    raise err
-                finally:
-                    update_running = False
+        def update_graph_detail(n, sent, view):
+            """
+            New points of the latest snapshot, not received yet by this browser.
+            The overview is not extended while zoomed in: its points are the
+            ones of the window, sent again when zooming out.
+            """
+            snapshot = ingest.snapshot
+            if snapshot.version == sent['version']:
+                raise PreventUpdate
+
+            detail_new = snapshot.detail[
+                snapshot.detail.index > pd.Timestamp(sent['detail'])
+            ]
+            after = pd.Timestamp(sent['overview'])
+            if view is not None and view['range']:
+                overview_new = snapshot.overview.frame().iloc[:0]
             else:
-                print(f"#### Update already running! {nb_lines_read} lines read.")
+                if view is not None:
+                    # the overview sent when zooming out has the buckets until its end
+                    after = max(after, pd.Timestamp(view['overview']))
+                overview_new = new_buckets(
+                    snapshot.overview.between(start=after), after
+                )
+            sent = dict(
+                version=snapshot.version,
+                detail=str(snapshot.detail.index[-1]),
+                overview=(
+                    str(overview_new.index[-1]) if len(overview_new) else str(after)
+                ),
+            )
+            return (
+                (
+                    extend_data(detail_names, detail_new, detail_points)
+                    if len(detail_new)
+                    else no_update
+                ),
+                (
+                    extend_data(overview_names, overview_new)
+                    if len(overview_new)
+                    else no_update
+                ),
+                sent,
+            )
 
-            return figure_detail, figure  # , data
+        @app.callback(
+            Output('graph_all_figure', 'data'),
+            Output('view', 'data'),
+            Input('graph_all', 'relayoutData'),
+            prevent_initial_call=True,
+        )
+        def update_view(relayout):
+            """
+            Overview, or visible window re-queried at the best resolution, and
+            the state of the 'view' store
+            """
+            snapshot = ingest.snapshot
+            window = relayout_range(relayout, snapshot.data.tz)
+            if window is None:
+                raise PreventUpdate
+            start = datetime.datetime.now()
+            view = dict(
+                data=[dict(trace) for trace in overview['data']],
+                layout=dict(overview['layout']),
+            )
+            if window == (None, None):
+                data_view = snapshot.overview.frame()
+                view['layout']['xaxis'] = dict(view['layout']['xaxis'], autorange=True)
+            else:
+                data_view = query_window(
+                    snapshot.rollup, snapshot.data.between(*window), *window
+                )
+                view['layout']['xaxis'] = dict(
+                    view['layout']['xaxis'],
+                    range=[str(t.tz_localize(None)) for t in window],
+                )
+            update_figure(view, data_view, args.pixels)
+            print(
+                f"View {window} queried in {(datetime.datetime.now() - start).total_seconds()} seconds."
+            )
+            return figure_payload(view), dict(
+                range=None if window == (None, None) else [str(t) for t in window],
+                # last bucket of the overview sent, not extended again
+                overview=str(snapshot.overview.end),
+            )
 
         print(f"Data loaded, {len(data)} lines read. Launching app")
-        app.run_server(port=args.port)
+        ingest.start()
+        try:
+            app.run_server(port=args.port)
+        finally:
+            ingest.stop()
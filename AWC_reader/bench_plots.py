@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Benchmarks of the preparation of the plotted traces, on a synthetic log"""
+
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+from path import Path
+
+from bench_read_logs import load_reader, write_log
+
+
+def _prepare_data_dict(reader, data, traces_par, pixels):
+    """Previous preparation: specs and styles resolved again for each trace"""
+    cols = data.columns
+    index = data.index
+    times = index.values
+    traces = {}
+    for trace_p in traces_par:
+        trace_p = trace_p.copy()
+
+        line_par = [k for k in trace_p if k in reader.LINES_PARAM]
+        line_par = dict((k, trace_p.pop(k)) for k in line_par)
+        if trace_p['column'] in cols:
+            name = trace_p['name']
+            ratio = trace_p.pop('ratio') if 'ratio' in trace_p else 1
+            col = trace_p.pop('column')
+            yaxis = trace_p.pop('yaxis') if 'yaxis' in trace_p else 'y1'
+            x = index
+            y = data[col].values * ratio
+            if pixels:
+                kept = reader.m4_indices(times, y, pixels)
+                if len(kept) < len(y):
+                    x, y = index[kept], y[kept]
+            traces[name] = dict(x=x, y=y, yaxis=yaxis, **trace_p, line=line_par)
+
+            trace = traces[name]
+            for leg in reader.COLORS:
+                if leg in name:
+                    trace['line'].update(dict(color=reader.COLORS[leg]))
+            for leg in reader.DASH:
+                if leg in name:
+                    trace['line'].update(dict(dash=reader.DASH[leg]))
+            for leg in reader.WIDTH:
+                if leg in name:
+                    trace['line'].update(dict(width=reader.WIDTH[leg]))
+    return traces
+
+
+def _timing(function, repeat):
+    """Best time of `repeat` calls of `function`, in ms"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1e3
+
+
+def _check(reader, data, pixels):
+    """Same traces as the previous preparation"""
+    previous = _prepare_data_dict(reader, data, reader.TRACES, pixels)
+    traces = reader.prepare_data_dict(data, pixels=pixels)
+    assert list(traces) == list(previous)
+    for name, trace in traces.items():
+        assert trace.keys() == previous[name].keys(), name
+        assert trace['x'].equals(previous[name]['x']), name
+        np.testing.assert_array_equal(trace['y'], previous[name]['y'])
+        for key in trace.keys() - {'x', 'y'}:
+            assert trace[key] == previous[name][key], (name, key)
+
+
+def bench_traces(nb_lines=36000, sizes=(60, 3000, 36000), repeat=20):
+    """Trace preparation time of the last `sizes` rows, all the columns plotted"""
+    reader = load_reader()
+    with tempfile.TemporaryDirectory() as tmp:
+        data = reader.read_file_data(write_log(Path(tmp) / 'log.log', nb_lines))
+    print(f"Preparing {len(reader.TRACES)} traces of {data.shape[1]} columns:")
+
+    for size in sizes:
+        window = data.iloc[-size:]
+        for pixels in [None, reader.PIXELS]:
+            _check(reader, window, pixels)
+            previous = _timing(
+                lambda: _prepare_data_dict(reader, window, reader.TRACES, pixels),
+                repeat,
+            )
+            plan = _timing(
+                lambda: reader.prepare_data_dict(window, pixels=pixels), repeat
+            )
+            print(
+                f"  {size:6d} rows, pixels {str(pixels):5s}"
+                f"  previous{previous:8.2f} ms  plan{plan:8.2f} ms"
+                f"{previous / plan:6.2f}x"
+            )
+
+
+def parse_args(args):
+    parser = ArgumentParser(description="Benchmarks of the trace preparation.")
+    parser.add_argument("--lines", dest='nb_lines', type=int, default=36000)
+    parser.add_argument("--repeat", dest='repeat', type=int, default=20)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    bench_traces(args.nb_lines, repeat=args.repeat)
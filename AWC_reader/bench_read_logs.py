@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Benchmarks of the AWC log loaders, on synthetic log files"""
+
+import datetime
+import importlib.util
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from io import StringIO
+
+import psutil
+from path import Path
+
+HEADER = (
+    'Timestamp_UTC; P[kW]; Q[kvar]; U_L1L2[V]; U_L2L3[V]; U_L3L1[V]; I_L1[A]; '
+    'I_L2[A]; I_L3[A]; f[mHz]; PMin[kW]; PMax[kW]; P_set[kW]; Q_set[kW]; '
+    'P_setToTSC[kW]; Q_setToTSC[kW]; P_setReadback[kW]; Q_setReadback[kW]; '
+    'E[kWh]; E_PMax[kWh]; P_TSC[kW]; Q_TSC[kW]'
+)
+NB_LINES = 1_000_000
+MEMORY_SAMPLING = 0.01  # seconds, period of the memory samples
+
+
+def load_reader():
+    """2Acren_read_AWC_logs module, its name is not importable"""
+    spec = importlib.util.spec_from_file_location(
+        'read_AWC_logs', Path(__file__).parent / '2Acren_read_AWC_logs.py'
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_log(file, nb_lines=NB_LINES, trailing_semicolon=False, seed=0):
+    """Log of `nb_lines` lines at 100 ms, in the older format if `trailing_semicolon`"""
+    rand = random.Random(seed)
+    nb_values = len(HEADER.split(';')) - 1
+    end = ';\n' if trailing_semicolon else '\n'
+    start = datetime.datetime(2022, 10, 1)
+    with open(file, 'w') as f:
+        f.write(HEADER + end)
+        for i in range(nb_lines):
+            timestamp = start + datetime.timedelta(milliseconds=100 * i)
+            values = ';'.join(
+                f' {rand.uniform(-1e4, 1e4):.3f}' for _ in range(nb_values)
+            )
+            f.write(f"{timestamp.strftime('%d/%m/%Y %H:%M:%S.%f')[:-3]};{values}{end}")
+    return file
+
+
+def load_replace(reader, file):
+    """Previous loading of the older format: whole file copied, ';' replaced"""
+    with open(file) as f:
+        file_content = StringIO(f.read().replace(';\n', '\n'))
+    return reader.read_file_data(file_content)
+
+
+def load_pandas(reader, file):
+    return reader.read_file_data(file)
+
+
+def load_arrow(reader, file, dtype='float64'):
+    return reader._process_data(reader.read_file_mmap(file, dtype))
+
+
+def load_arrow32(reader, file):
+    return load_arrow(reader, file, 'float32')
+
+
+LOADERS = dict(
+    replace=load_replace, pandas=load_pandas, arrow=load_arrow, arrow32=load_arrow32
+)
+
+
+def _memory(process):
+    """Peak working set on Windows, else current resident memory, in bytes"""
+    info = process.memory_info()
+    return getattr(info, 'peak_wset', info.rss)
+
+
+def _measure(loader, file, queue):
+    # peak memory of the loading only, after the imports
+    reader = load_reader()
+    import pyarrow.csv  # noqa: F401
+
+    process = psutil.Process()
+    before = peak = _memory(process)
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(MEMORY_SAMPLING):
+            peak = max(peak, _memory(process))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    data = LOADERS[loader](reader, file)
+    duration = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    peak = max(peak, _memory(process))
+    queue.put((duration, (peak - before) / 2**20, data.shape))
+
+
+def measure(loader, file):
+    """Wall time and peak memory increase (MB) of `loader`, in a fresh process"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(loader, file, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def bench_loaders(nb_lines=NB_LINES, folder=None):
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        for trailing_semicolon, loaders in [
+            (True, ['replace', 'arrow', 'arrow32']),
+            (False, ['pandas', 'arrow', 'arrow32']),
+        ]:
+            file = write_log(
+                Path(tmp) / 'log.log', nb_lines, trailing_semicolon=trailing_semicolon
+            )
+            size = file.size / 1e6
+            print(
+                f"Loading {nb_lines} lines, {size:.0f} MB, "
+                f"{'older' if trailing_semicolon else 'current'} format:"
+            )
+            for loader in loaders:
+                duration, peak, shape = measure(loader, file)
+                print(
+                    f"  {loader:10s}{duration:8.2f} s{size / duration:8.1f} MB/s"
+                    f"{peak:8.0f} MB peak{shape[0]:10d} rows"
+                )
+
+
+def bench_workers(nb_files=24, nb_lines=36000, max_workers=None, folder=None):
+    """Parsing time of `nb_files` files with 1 to `max_workers` processes"""
+    # imported here, the workers are only needed for this benchmark
+    from parallel_read import merge, parse_files
+
+    max_workers = max_workers or os.cpu_count()
+    with tempfile.TemporaryDirectory(dir=folder) as tmp:
+        files = [
+            write_log(Path(tmp) / f'log{i:03d}.log', nb_lines, seed=i)
+            for i in range(nb_files)
+        ]
+        size = sum(f.size for f in files) / 1e6
+        print(
+            f"Parsing {nb_files} files of {nb_lines} lines, {size:.0f} MB, "
+            f"{os.cpu_count()} CPUs:"
+        )
+        for engine in ['pandas', 'arrow']:
+            reference = None
+            for workers in range(1, max_workers + 1):
+                start = time.perf_counter()
+                data = merge(parse_files(files, engine, workers))
+                duration = time.perf_counter() - start
+                reference = reference or duration
+                print(
+                    f"  {engine:8s}{workers:3d} workers{duration:8.2f} s"
+                    f"{size / duration:8.1f} MB/s{reference / duration:6.2f}x"
+                    f"{len(data):10d} rows"
+                )
+
+
+def parse_args(args):
+    parser = ArgumentParser(description="Benchmarks of the AWC log loaders.")
+    parser.add_argument("--lines", dest='nb_lines', type=int, default=NB_LINES)
+    parser.add_argument(
+        "--files",
+        dest='nb_files',
+        type=int,
+        default=24,
+        help="Number of files of the parallel parsing benchmark",
+    )
+    parser.add_argument(
+        "--workers",
+        dest='max_workers',
+        type=int,
+        default=None,
+        help="Maximum number of processes, all CPUs by default",
+    )
+    parser.add_argument(
+        "--folder", dest='folder', default=None, help="Folder of the temporary logs"
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    bench_loaders(args.nb_lines, args.folder)
+    bench_workers(args.nb_files, max_workers=args.max_workers, folder=args.folder)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+
+
+class ChunkedFrame:
+    """
+    Rows of a DataFrame in time order, kept in chunks never modified: appending
+    does not copy the previous rows, and a ChunkedFrame is not changed by
+    `append` or `update`, which return a new one sharing its chunks.
+    The last chunks are merged while of similar sizes, so there are a few of
+    them and each row is copied a logarithmic number of times.
+    Rows are only concatenated when asked for, by `between` or `frame`.
+    """
+
+    def __init__(self, chunks=()):
+        self.chunks = [chunk for chunk in chunks if len(chunk)]
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    @property
+    def start(self):
+        return self.chunks[0].index[0] if self.chunks else None
+
+    @property
+    def end(self):
+        return self.chunks[-1].index[-1] if self.chunks else None
+
+    @property
+    def tz(self):
+        return self.chunks[0].index.tz if self.chunks else None
+
+    def append(self, data: pd.DataFrame):
+        """ChunkedFrame with the rows of `data` added, later than its rows"""
+        chunks = list(self.chunks)
+        if len(data):
+            chunks.append(data)
+        while len(chunks) > 1 and len(chunks[-2]) <= 2 * len(chunks[-1]):
+            chunks[-2:] = [pd.concat(chunks[-2:])]
+        return ChunkedFrame(chunks)
+
+    def update(self, data: pd.DataFrame):
+        """ChunkedFrame with its rows from the start of `data` replaced by it"""
+        if not len(data):
+            return self
+        start = data.index[0]
+        chunks = list(self.chunks)
+        while chunks and chunks[-1].index[-1] >= start:
+            chunk = chunks.pop()
+            position = chunk.index.searchsorted(start)
+            if position:
+                chunks.append(chunk.iloc[:position])
+                break
+        return ChunkedFrame(chunks).append(data)
+
+    def between(self, start=None, end=None):
+        """DataFrame of the rows from `start` to `end` included, all by default"""
+        chunks = [
+            chunk
+            for chunk in self.chunks
+            if (start is None or chunk.index[-1] >= start)
+            and (end is None or chunk.index[0] <= end)
+        ]
+        if not chunks:
+            return self.chunks[0].iloc[:0] if self.chunks else pd.DataFrame()
+        frame = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+        return frame.loc[start:end]
+
+    def frame(self):
+        """DataFrame of all the rows"""
+        return self.between()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import datetime
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from path import Path
+
+from read_telnet import (
+    CHUNK_DELAY,
+    TIMESTAMP_FORMATS,
+    TimedRotatingFileHandlerWithHeader,
+)
+
+ROW_GROUP_SIZE = 10000  # max rows per Parquet row group / Arrow record batch
+EXTENSIONS = dict(parquet='.parquet', arrow='.arrows')
+
+
+def parse_header(header):
+    """Column names of an AWC header line, without spaces and empty names"""
+    return [c.replace(' ', '') for c in header.split(';') if c.strip()]
+
+
+def _date_format(timestamp):
+    """Format of the AWC timestamps, None to let pandas guess it"""
+    for date_fmt in TIMESTAMP_FORMATS:
+        try:
+            datetime.datetime.strptime(timestamp, date_fmt)
+        except ValueError:
+            continue
+        return date_fmt
+
+
+class ColumnarFileHandler(TimedRotatingFileHandlerWithHeader):
+    """
+    Rotating Parquet or Arrow IPC stream file of the AWC telnet lines.
+    Lines are parsed once into typed columns with the names of the header line:
+    UTC timestamps and float64 values. Each chunk of lines is appended as a
+    row group (Parquet) or a record batch (Arrow), on the same rotation
+    schedule as the text files.
+    Arrow IPC stream files can be read while written, Parquet files only once
+    closed.
+    """
+
+    def __init__(
+        self,
+        logfile: Path,
+        header='',
+        fmt='parquet',
+        chunk_size=ROW_GROUP_SIZE,
+        chunk_delay=CHUNK_DELAY,
+        **kwargs,
+    ):
+        logfile = Path(logfile)
+        logfile = logfile.stripext() + EXTENSIONS[fmt]
+        # no text stream nor header written by the base classes
+        super(ColumnarFileHandler, self).__init__(logfile, delay=True, **kwargs)
+        self.fmt = fmt
+        self.columns = parse_header(header)
+        self.schema = pa.schema(
+            [pa.field(self.columns[0], pa.timestamp('ms', tz='UTC'))]
+            + [pa.field(c, pa.float64()) for c in self.columns[1:]]
+        )
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self._writer = None
+        self._sink = None
+        self._date_fmt = None
+        self._rows = []
+        self._chunk_start = None
+
+    def _open_writer(self):
+        if self.fmt == 'parquet':
+            return pq.ParquetWriter(self.baseFilename, self.schema)
+        self._sink = pa.OSFile(self.baseFilename, 'wb')
+        return pa.ipc.new_stream(self._sink, self.schema)
+
+    def _parse(self, rows):
+        """Typed columns of the split lines `rows`"""
+        nb_columns = len(self.columns)
+        frame = pd.DataFrame(
+            [(row + [''] * nb_columns)[:nb_columns] for row in rows],
+            columns=self.columns,
+        )
+
+        times = frame.iloc[:, 0].str.strip()
+        if self._date_fmt is None:
+            self._date_fmt = _date_format(times.iloc[0])
+        timestamps = pd.to_datetime(
+            times, format=self._date_fmt, dayfirst=True, errors='coerce'
+        ).dt.tz_localize('UTC')
+        arrays = [pa.array(timestamps, type=self.schema.field(0).type)]
+        for c in self.columns[1:]:
+            values = pd.to_numeric(frame[c].str.strip(), errors='coerce')
+            arrays.append(pa.array(values, type=pa.float64(), from_pandas=True))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def write_lines(self, lines):
+        if not lines:
+            self.flush_expired()
+            return
+        if self.shouldRollover(None):
+            self.flush_lines()
+            self.doRollover()
+
+        if self._chunk_start is None:
+            self._chunk_start = time.monotonic()
+        self._rows.extend(line.split(';') for line in lines if line)
+        if len(self._rows) >= self.chunk_size:
+            self.flush_lines()
+        else:
+            self.flush_expired()
+
+    def flush_expired(self):
+        """Append the chunk if its first line is older than `chunk_delay`"""
+        if (
+            self._chunk_start is not None
+            and time.monotonic() - self._chunk_start >= self.chunk_delay
+        ):
+            self.flush_lines()
+
+    def flush_lines(self):
+        """Append the parsed lines waiting in the chunk"""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []  # dropped if not parsed
+        self._chunk_start = None
+        batch = self._parse(rows)
+
+        self.acquire()
+        try:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            if self.fmt == 'parquet':
+                self._writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                self._writer.write_batch(batch)
+        finally:
+            self.release()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def doRollover(self):
+        self._close_writer()
+        super(ColumnarFileHandler, self).doRollover()
+
+    def close(self):
+        try:
+            self.flush_lines()
+        finally:
+            self._close_writer()
+            super(ColumnarFileHandler, self).close()
+
+
+def read_columnar(file):
+    """DataFrame of a Parquet or Arrow IPC stream file, indexed by UTC time"""
+    file = Path(file)
+    if file.ext == EXTENSIONS['parquet']:
+        table = pq.read_table(file)
+    else:
+        with pa.OSFile(file, 'rb') as source:
+            reader = pa.ipc.open_stream(source)
+            batches = []
+            try:
+                for batch in reader:
+                    batches.append(batch)
+            except pa.ArrowInvalid:
+                pass  # last batch still being written
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+    data = table.to_pandas()
+    return data.set_index(data.columns[0])
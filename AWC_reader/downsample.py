@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+PIXELS = 2000  # horizontal pixels of a plot, budget of points per trace
+
+
+def m4_indices(x, y, pixels=PIXELS):
+    """
+    Indices of the points kept by M4 downsampling: in each of `pixels` equal
+    time buckets, the first, last, minimum and maximum points. The line drawn
+    at that width is the same, peaks included, with at most 4 points per pixel.
+    Missing values are dropped when downsampling.
+    :param x: sorted times, as datetime64 or numbers
+    :param y: values
+    """
+    y = np.asarray(y, dtype=float)
+    if len(y) <= 4 * pixels:
+        return np.arange(len(y))
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= 4 * pixels:
+        return valid
+
+    x = np.asarray(x)
+    x = x.view('int64') if x.dtype.kind == 'M' else x
+    x = x[valid].astype(float)
+    span = x[-1] - x[0]
+    buckets = np.minimum(((x - x[0]) / (span or 1) * pixels).astype(int), pixels - 1)
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    # sorted by bucket then value: min first and max last of each bucket
+    order = np.lexsort((y[valid], buckets))
+    kept = np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+    return valid[kept]
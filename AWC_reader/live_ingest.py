@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from chunked_frame import ChunkedFrame
+from ring_buffer import RingBuffer
+from rollup import RollupStore, envelope
+
+# Immutable state of the live data: published whole, never modified after.
+# `data` and `overview` are ChunkedFrames, `detail` a DataFrame.
+Snapshot = namedtuple('Snapshot', ['version', 'data', 'detail', 'overview', 'rollup'])
+
+
+class LiveIngest(threading.Thread):
+    """
+    Background reading of the rows appended to a live log, every `period`
+    seconds: the raw data, the detail window and the rollups are updated, then
+    published together as a new Snapshot.
+    The detail window is a RingBuffer of the numeric columns: its snapshot
+    frames are views, valid for one more window of new rows, far longer than a
+    callback serializing them.
+    The raw data and the overview are ChunkedFrames: each update appends the
+    new rows and recomputes the last buckets of the overview only, so its work
+    does not grow with the history.
+    Readers only take `snapshot`, so any number of Dash callbacks serialize it
+    at once without reading the files again.
+    """
+
+    def __init__(
+        self,
+        read_new,
+        data: pd.DataFrame,
+        rollup: RollupStore,
+        detail_rows,
+        freq=None,
+        period=6,
+    ):
+        """
+        :param read_new: function returning the new rows of the log
+        :param data: rows already read, in `rollup` as well
+        :param detail_rows: rows of the detail window
+        :param freq: frequency of the overview, a rollup level or a pandas
+                     frequency of which the min and max rows of the buckets are
+                     plotted, None for the raw data
+        """
+        super(LiveIngest, self).__init__(name='LiveIngest', daemon=True)
+        self.read_new = read_new
+        self.rollup = rollup
+        self.detail = RingBuffer(
+            detail_rows, data.select_dtypes('number').columns, tz=data.index.tz
+        )
+        self.detail.append(data)
+        self.freq = freq
+        self.period = period
+        self.stats = dict(updates=0, rows=0, errors=0, duration=0)
+        self._stop_event = threading.Event()
+        # rows read from the log but not added yet, retried by the next update
+        self._pending = []
+        # same buckets for the whole overview and the recomputed ones
+        self._origin = data.index[0].normalize() if len(data) else 'start_day'
+        self._snapshot = Snapshot(
+            0,
+            ChunkedFrame([data]),
+            self.detail.frame(),
+            self._overview(ChunkedFrame(), data),
+            self.rollup.snapshot(),
+        )
+
+    @property
+    def snapshot(self) -> Snapshot:
+        return self._snapshot
+
+    def _overview(self, overview: ChunkedFrame, data_new):
+        """
+        `overview` with its last bucket, the only one still growing, and the
+        buckets of `data_new` recomputed
+        """
+        if not self.freq:
+            return overview.append(data_new)
+        if self.freq in self.rollup.levels:
+            return overview.update(
+                self.rollup.get(self.freq, 'envelope', start=overview.end)
+            )
+        if overview.end is not None:
+            # rows of the last bucket, in the raw data or the new rows
+            data_new = pd.concat(
+                [self._snapshot.data.between(start=overview.end), data_new]
+            )
+        resampler = data_new.select_dtypes('number').resample(
+            self.freq, origin=self._origin
+        )
+        return overview.update(envelope(resampler.min(), resampler.max()))
+
+    def update(self):
+        """Read the new rows and publish a new snapshot, if any"""
+        start = time.perf_counter()
+        data_new = self.read_new()
+        if len(data_new):
+            self._pending.append(data_new)
+        if not self._pending:
+            return
+        data_new = pd.concat(self._pending)
+        # unchanged if it raises: the rows stay pending for the next update
+        self.rollup.update(data_new)
+        self._pending = []
+
+        self.detail.append(data_new)
+        snapshot = self._snapshot
+        self._snapshot = Snapshot(
+            snapshot.version + 1,
+            snapshot.data.append(data_new),
+            self.detail.frame(),
+            self._overview(snapshot.overview, data_new),
+            self.rollup.snapshot(),
+        )
+
+        self.stats['updates'] += 1
+        self.stats['rows'] += len(data_new)
+        self.stats['duration'] = time.perf_counter() - start
+        print(
+            f"{len(data_new)} lines read, snapshot {self._snapshot.version} "
+            f"published in {self.stats['duration']:.3f} seconds."
+        )
+
+    def run(self):
+        while not self._stop_event.wait(self.period):
+            try:
+                self.update()
+            except Exception as err:
+                self.stats['errors'] += 1
+                print(f"Error updating: {err}")
+
+    def stop(self):
+        self._stop_event.set()
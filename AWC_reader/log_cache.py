@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+
+import pandas as pd
+from path import Path
+
+CACHE_FOLDER = Path('~/.cache/AWC_reader').expanduser()
+MAX_SIZE = 2 << 30  # bytes of cached data kept on disk
+EXTENSION = '.pkl'
+
+
+class ParsedLogCache:
+    """
+    On-disk cache of the processed DataFrames of log files, keyed by the file
+    path, size, modification time, the parser version and the parse engine and
+    dtype: a file changed, or parsed by another version or engine, is a miss.
+    The least recently used entries are removed once the cache is larger than
+    `max_size` bytes.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, max_size=MAX_SIZE, version=0):
+        self.folder = Path(folder)
+        self.max_size = max_size
+        self.version = version
+        self.stats = dict(hits=0, misses=0, evictions=0)
+
+    def _entry(self, file, engine, dtype):
+        file = Path(file).abspath()
+        stat = file.stat()
+        key = (
+            f'{file}|{stat.st_size}|{stat.st_mtime_ns}|{self.version}|{engine}|{dtype}'
+        )
+        return self.folder / hashlib.sha1(key.encode()).hexdigest() + EXTENSION
+
+    def load(self, file, engine='pandas', dtype='float64'):
+        """Processed data of `file` if cached, else None"""
+        entry = self._entry(file, engine, dtype)
+        if not entry.exists():
+            self.stats['misses'] += 1
+            return None
+        try:
+            data = pd.read_pickle(entry)
+        except Exception as err:
+            print(f"Cache entry of {file} unreadable, parsing it again: {err}")
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        # modification time of the entry is its LRU order
+        os.utime(entry)
+        return data
+
+    def store(self, file, data, engine='pandas', dtype='float64'):
+        entry = self._entry(file, engine, dtype)
+        self.folder.makedirs_p()
+        # written aside, so a concurrent reader never sees a partial entry
+        tmp = entry + f'.{os.getpid()}.tmp'
+        data.to_pickle(tmp)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def get(self, file, parse, engine='pandas', dtype='float64'):
+        """
+        Processed data of `file`, from the cache or from `parse(file)`
+        :param engine, dtype: options of `parse`, of the cache key
+        """
+        data = self.load(file, engine, dtype)
+        if data is None:
+            data = parse(file)
+            self.store(file, data, engine, dtype)
+        return data
+
+    def entries(self):
+        """Cache files, least recently used first"""
+        if not self.folder.exists():
+            return []
+        return sorted(self.folder.files('*' + EXTENSION), key=lambda f: f.mtime)
+
+    @property
+    def size(self):
+        return sum(f.size for f in self.entries())
+
+    def evict(self):
+        """Remove the least recently used entries until within `max_size`"""
+        entries = self.entries()
+        size = sum(f.size for f in entries)
+        for entry in entries:
+            if size <= self.max_size:
+                break
+            size -= entry.size
+            entry.remove_p()
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        for entry in self.entries():
+            entry.remove_p()
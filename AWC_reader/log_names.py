@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import datetime
+import re
+
+from path import Path
+
+FORMAT_DATETIME = '%Y%m%d_%H%M%S'
+DATE_PATTERN = re.compile(r'\d{8}_\d{4}(\d{2})?')
+
+
+def _read_file_dt(filename):
+    """UTC datetime at the start of a file name, with or without the seconds"""
+    match = DATE_PATTERN.match(Path(filename).basename())
+    if match is None:
+        raise ValueError(f"File name {filename} does not start with a date")
+    date = match.group()
+    date_fmt = FORMAT_DATETIME if len(date) == 15 else FORMAT_DATETIME[:-2]
+    return datetime.datetime.strptime(date, date_fmt)
+
+
+def _dated_files(files):
+    """Files of which the name starts with a date, the other ones skipped"""
+    return [f for f in files if DATE_PATTERN.match(Path(f).basename())]
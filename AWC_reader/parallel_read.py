@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import gc
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+
+import pandas as pd
+import pyarrow as pa
+from path import Path
+
+READER_FILE = Path(__file__).parent / '2Acren_read_AWC_logs.py'
+# on Windows a segment is freed when its last handle is closed, so before the
+# parent opens it once the worker has closed its own: streams sent as bytes
+SHARED_MEMORY = os.name != 'nt'
+
+_reader = None  # module of READER_FILE in the worker processes
+
+
+def _load_reader():
+    """2Acren_read_AWC_logs module, loaded once per process"""
+    global _reader
+    if _reader is None:
+        spec = importlib.util.spec_from_file_location('read_AWC_logs', READER_FILE)
+        _reader = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_reader)
+    return _reader
+
+
+def _write_stream(table, sink):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _parse_file(file, engine, dtype='float64'):
+    """
+    Worker parsing of a file into an Arrow IPC stream in shared memory, only its
+    name and size are sent back. Without SHARED_MEMORY, the stream is sent back
+    with a None name.
+    """
+    data = _load_reader().read_file_data(file, engine=engine, dtype=dtype)
+    table = pa.Table.from_pandas(data)
+    if not SHARED_MEMORY:
+        sink = pa.BufferOutputStream()
+        _write_stream(table, sink)
+        return None, sink.getvalue()
+
+    # size of the stream first, then written once in the shared memory
+    mock = pa.MockOutputStream()
+    _write_stream(table, mock)
+    size = mock.size()
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(memory.buf))
+    _write_stream(table, sink)
+    sink.close()
+    del sink
+    memory.close()
+    # unlinked by the parent process, not by the resource tracker of the worker
+    resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory.name, size
+
+
+def _read_stream(buffer):
+    with pa.ipc.open_stream(pa.py_buffer(buffer)) as reader:
+        return reader.read_pandas()
+
+
+def _receive(name, stream):
+    """
+    DataFrame of an Arrow IPC stream in shared memory, then released
+    :param stream: size of the stream, or the stream itself if `name` is None
+    """
+    if name is None:
+        return _read_stream(stream)
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        # copy of the columns and index which are views of the shared memory
+        data = _read_stream(memory.buf[:stream]).copy(deep=True)
+    finally:
+        # reference cycles of the pandas objects may still hold views of it
+        gc.collect()
+        memory.close()
+        memory.unlink()
+    return data
+
+
+def _release(name, stream):
+    """Unlink a shared memory stream not received"""
+    if name is None:
+        return
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    memory.close()
+    memory.unlink()
+
+
+def parse_files(files, engine='pandas', workers=None, dtype='float64'):
+    """
+    Processed data of each file, parsed in `workers` processes (all CPUs by
+    default)
+    """
+    workers = min(workers or os.cpu_count(), len(files))
+    if workers <= 1:
+        reader = _load_reader()
+        return [
+            reader.read_file_data(file, engine=engine, dtype=dtype) for file in files
+        ]
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_parse_file, file, engine, dtype) for file in files]
+        frames = []
+        try:
+            for future in futures:
+                frames.append(_receive(*future.result()))
+        finally:
+            # failed mid-merge: segments of the files parsed but not received
+            others = futures[len(frames) :]
+            for future in others:
+                future.cancel()
+            wait(others)
+            for future in others:
+                if not future.cancelled() and future.exception() is None:
+                    _release(*future.result())
+        return frames
+
+
+def merge(frames):
+    """Single DataFrame of `frames`, in time order"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames).sort_index(kind='stable')
@@ -10,6 +10,8 @@ import plotly.graph_objs._figure
 from path import Path
 from plotly import express as px
 
+from log_names import _read_file_dt
+
 
 class AWC_log_reader:
     """
@@ -25,32 +27,35 @@ class AWC_log_reader:
     def __init__(self, folder_base):
         self.folder_base = folder_base
 
-    def _read_file_dt(self, filename):
-        return datetime.datetime.strptime(
-            Path(filename).stem.split('-')[0], self.FORMAT_DATETIME
-        )
-
     def search_last_file_content(
         self, start_dt: Union[str, datetime.datetime] = None, nb_hours=24
     ):
+        """
+        Content of the last file, or list of the contents of the files with data
+        in the `nb_hours` from `start_dt` (UTC, as in the file names)
+        """
         # folder /= '20221017'
         self.files = pd.DataFrame(
             data=self.folder_base.walk('*AWC*.log'), columns=['path']
         )
 
-        self.files['dt'] = [self._read_file_dt(f) for f in self.files]
+        self.files['dt'] = [_read_file_dt(f) for f in self.files['path']]
 
-        self.files.sort_values(by='dt')
+        self.files = self.files.sort_values(by='dt').reset_index(drop=True)
         if not start_dt:
-            self.files.sort(key=self._read_file_dt())[-1:]
-        else:
-            if not isinstance(start_dt, datetime.datetime):
-                start_dt = datetime.datetime.strptime(start_dt, self.FORMAT_DATETIME)
-            files
-
-        files = [f for f in files if f.get]
-        file = files[-1]
-
+            return self._file_content(self.files['path'].iloc[-1])
+
+        if not isinstance(start_dt, datetime.datetime):
+            start_dt = datetime.datetime.strptime(start_dt, self.FORMAT_DATETIME)
+        end_dt = start_dt + datetime.timedelta(hours=nb_hours)
+        # each file spans until the next one of the same date
+        dates = self.files['dt']
+        first = max(dates.searchsorted(start_dt, side='right') - 1, 0)
+        first = dates.searchsorted(dates.iloc[first], side='left')
+        last = dates.searchsorted(end_dt, side='right')
+        return [self._file_content(f) for f in self.files['path'].iloc[first:last]]
+
+    def _file_content(self, file):
         # date_file = datetime.datetime.strptime(file.basename()[:8], format='%Y%m%d')
         date_file_str = file.basename()[:8]
 
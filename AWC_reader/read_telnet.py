@@ -3,25 +3,44 @@
 # import subprocess
 import asyncio
 import datetime
+import locale
 import logging
-import telnetlib
+import os
+import sys
 import time
+import traceback
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from functools import partial
 from logging.handlers import TimedRotatingFileHandler
 
-# from argparse import ArgumentParser
 import psutil
-import telnetlib3
 from path import Path
 
 
 IPs = dict(AWC1='10.2.2.201', AWC2='10.2.2.205')
 FOLDER = r'G:\.shortcut-targets-by-id\1zJg6xXMQtwsL4z7K86PE8FS6FspMhFec\04_PROJETS\21_Deux-Acren\13_EXECUTION\Réception\Tests préalables\DEIF-exports'
 
+TELNET_PORT = 23
 FILE_PATTERN = "{date}_AWC{awc}.log"
 DATEFORMAT = '%Y%m%d_%H%M'
 
 TIMELOGGER = dict(when='H', interval=1, date_fmt='%Y%m%d_%H%M')
 
+CHUNK_SIZE = 1 << 16  # bytes written at once by BatchFileHandler
+CHUNK_DELAY = 0.5  # max seconds before writing the lines received
+READ_TIMEOUT = 30  # seconds without data before reconnecting
+REPORT_PERIOD = 60  # seconds between stream statistics
+TIMESTAMP_FORMATS = [
+    '%d/%m/%Y %H:%M:%S.%f',
+    '%d/%m/%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M:%S.%f',
+    '%d.%m.%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+]
+STREAM_STATS = dict()  # StreamStats by AWC
+
 test = True
 if test:
     FOLDER = Path(r'C:\Users\MLevy\Documents\2Acren')
@@ -97,6 +116,95 @@ class TimedRotatingFileHandlerWithHeader(TimedRotatingFileHandler):
         self._write_header(self.baseFilename)
 
 
+class BatchFileHandler(TimedRotatingFileHandlerWithHeader):
+    """
+    Rotating file with header, written by chunks of lines with a single write
+    each, instead of one logging record per line.
+    A chunk is written when it reaches `chunk_size` bytes, or `chunk_delay`
+    seconds after its first line: `write_lines([])` is called by the reader
+    while the stream is idle, to write the lines waiting.
+    :param fsync: 'chunk' to sync each chunk to disk, 'rotation' to sync each
+                  file when closed, 'never' to let the system do it
+    """
+
+    def __init__(
+        self,
+        logfile: Path,
+        header='',
+        chunk_size=CHUNK_SIZE,
+        chunk_delay=CHUNK_DELAY,
+        fsync='rotation',
+        **kwargs,
+    ):
+        super(BatchFileHandler, self).__init__(logfile, header=header, **kwargs)
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.fsync = fsync
+        self._lines = []
+        self._size = 0
+        self._chunk_start = None
+
+    def write_lines(self, lines):
+        if not lines:
+            self.flush_expired()
+            return
+        if self.shouldRollover(None):
+            self.flush_lines()
+            self.doRollover()
+
+        if self._chunk_start is None:
+            self._chunk_start = time.monotonic()
+        self._lines.extend(lines)
+        self._size += sum(len(line) for line in lines) + len(lines)
+        if self._size >= self.chunk_size:
+            self.flush_lines()
+        else:
+            self.flush_expired()
+
+    def flush_expired(self):
+        """Write the chunk if its first line is older than `chunk_delay`"""
+        if (
+            self._chunk_start is not None
+            and time.monotonic() - self._chunk_start >= self.chunk_delay
+        ):
+            self.flush_lines()
+
+    def flush_lines(self):
+        """Write the lines waiting in the chunk"""
+        if not self._lines:
+            return
+        self._lines.append('')
+        data = os.linesep.join(self._lines).encode(
+            self.encoding or locale.getpreferredencoding(False)
+        )
+        self._lines = []
+        self._size = 0
+        self._chunk_start = None
+
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            os.write(self.stream.fileno(), data)
+            if self.fsync == 'chunk':
+                os.fsync(self.stream.fileno())
+        finally:
+            self.release()
+
+    def doRollover(self):
+        if self.stream and self.fsync != 'never':
+            os.fsync(self.stream.fileno())
+        super(BatchFileHandler, self).doRollover()
+
+    def close(self):
+        try:
+            self.flush_lines()
+            if self.stream and self.fsync != 'never':
+                os.fsync(self.stream.fileno())
+        finally:
+            super(BatchFileHandler, self).close()
+
+
 def get_ip(awc):
     return IPs[f"AWC{awc}"]
 
@@ -130,55 +238,325 @@ def create_data_logger(file_basename, header='', level = logging.DEBUG):
     return logger
 
 
-async def lauch_telnet(awc=1, folder=None):
-    """Launch a telnet reading command on awc `awc`to file `file`"""
-    if not folder:
-        folder = Path(FOLDER)
-    filename_pattern = folder / FILE_PATTERN.format(awc=awc, date='{date}')
+def create_data_writer(file_basename, header='', ingest='text', **kwargs):
+    """
+    Rotating file with header, written by chunks of lines
+    :param ingest: 'text' to write the lines as received, 'parquet' or 'arrow'
+                   to write them parsed in columns
+    """
+    if ingest == 'text':
+        return BatchFileHandler(file_basename, header=header, **TIMELOGGER, **kwargs)
+
+    # optional dependencies, only needed for columnar files
+    from columnar_writer import ColumnarFileHandler
+
+    return ColumnarFileHandler(
+        file_basename, header=header, fmt=ingest, **TIMELOGGER, **kwargs
+    )
+
+
+class TelnetStream:
+    """
+    Non-blocking telnet reader on asyncio streams.
+    All option negotiations are refused, data is returned by lines.
+    The first line sent by the AWC, the header of its columns, is read when
+    opening, so a stream can be handed over to another reader.
+    """
+
+    IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, reader, writer, timeout=READ_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self._partial = b''  # last line, not complete yet
+        self._lines = []  # complete lines not returned yet
+        self._command = b''  # telnet command, not complete yet
+        self._subnegotiation = False
+        self._last_read = time.monotonic()
+        self.header = ''
+
+    @classmethod
+    async def open(cls, host, port=TELNET_PORT, timeout=READ_TIMEOUT):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+        stream = cls(reader, writer, timeout)
+        try:
+            stream.header = await stream.readline()
+        except BaseException:
+            stream.close()
+            raise
+        return stream
+
+    def close(self):
+        self.writer.close()
+
+    def is_open(self):
+        """
+        Connection still usable, checked without reading: the lines received
+        meanwhile stay buffered
+        """
+        return not (
+            self.writer.is_closing()
+            or self.reader.at_eof()
+            or self.reader.exception() is not None
+        )
 
-    use_telnetlib3 = False
-    if use_telnetlib3:
-        tnet_io = telnetlib3.open_connection(get_ip(awc), port=23, cols=300, log=None)
-        # r,w =asyncio.run(tnet_io)
-        # while True:
-        #     readline = asyncio.create_task(r.readline())
-        #     await readline
-        #     logger.info( readline.result().rstrip())
-
-    else:
-        retry_delay = 0
-        while True:
+    def _filter_commands(self, data):
+        """Remove telnet commands from `data`, and refuse the options asked"""
+        if self.IAC not in data and not (self._command or self._subnegotiation):
+            return data
+        data = self._command + data
+        self._command = b''
+        out = bytearray()
+        i = 0
+        while i < len(data):
+            byte = data[i]
+            if byte != self.IAC:
+                if not self._subnegotiation:
+                    out.append(byte)
+                i += 1
+                continue
+            if i + 1 >= len(data):
+                self._command = data[i:]
+                break
+            command = data[i + 1]
+            if command == self.IAC:
+                if not self._subnegotiation:
+                    out.append(self.IAC)
+                i += 2
+            elif command in (self.DO, self.DONT, self.WILL, self.WONT):
+                if i + 2 >= len(data):
+                    self._command = data[i:]
+                    break
+                if command in (self.DO, self.WILL):
+                    answer = self.WONT if command == self.DO else self.DONT
+                    self.writer.write(bytes([self.IAC, answer, data[i + 2]]))
+                i += 3
+            else:
+                if command == self.SB:
+                    self._subnegotiation = True
+                elif command == self.SE:
+                    self._subnegotiation = False
+                i += 2
+        return bytes(out)
+
+    async def read_lines(self, idle=None):
+        """
+        Complete lines received, as soon as available
+        :param idle: seconds after which an empty list is returned if no line
+                     is complete, `timeout` still counted from the last data
+        """
+        if self._lines:
+            lines, self._lines = self._lines, []
+            return lines
+        lines = []
+        while not lines:
+            wait = self._last_read + self.timeout - time.monotonic()
             try:
-                with telnetlib.Telnet(host=get_ip(awc), port=23) as tnet:
-                    header = tnet.read_until(b'\r\n').decode().rstrip()
-                    data_logger = create_data_logger(filename_pattern, header=header)
-                    for h in data_logger.handlers:
-                        print(
-                            f"Logging AWC {awc} in file \n{h.baseFilename}"
+                data = await asyncio.wait_for(
+                    self.reader.read(self.CHUNK_SIZE),
+                    wait if idle is None else min(idle, wait),
+                )
+            except asyncio.TimeoutError:
+                if idle is not None and idle < wait:
+                    return []
+                raise
+            self._last_read = time.monotonic()
+            if not data:
+                raise EOFError("Connection closed by AWC")
+            lines = (self._partial + self._filter_commands(data)).split(b'\r\n')
+            self._partial = lines.pop()
+        return [line.decode(errors='replace').rstrip() for line in lines]
+
+    async def readline(self):
+        lines = await self.read_lines()
+        self._lines = lines[1:]
+        return lines[0]
+
+
+class StreamStats:
+    """Throughput and lag of a telnet stream, lag computed from line timestamps"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = 0
+        self.bytes = 0
+        self.reconnections = 0
+        self.lag = None  # seconds
+        self.lag_max = 0
+        self._start = time.monotonic()
+        self._date_fmt = None
+
+    def _timestamp(self, line):
+        field = line.split(';', 1)[0].strip()
+        for date_fmt in [self._date_fmt] + TIMESTAMP_FORMATS:
+            if date_fmt:
+                try:
+                    dt = datetime.datetime.strptime(field, date_fmt)
+                except ValueError:
+                    continue
+                self._date_fmt = date_fmt
+                return dt
+
+    def update(self, lines):
+        self.lines += len(lines)
+        self.bytes += sum(len(line) + 2 for line in lines)
+        if lines:
+            dt = self._timestamp(lines[-1])
+            if dt:
+                self.lag = (datetime.datetime.utcnow() - dt).total_seconds()
+                self.lag_max = max(self.lag_max, self.lag)
+
+    def report(self):
+        duration = time.monotonic() - self._start
+        lag = 'unknown' if self.lag is None else f"{self.lag:.3f} s"
+        print(
+            f"{self.name}: {self.lines / duration:.1f} lines/s, "
+            f"{self.bytes / duration / 1000:.1f} kB/s, lag {lag} "
+            f"(max {self.lag_max:.3f} s), {self.reconnections} reconnections"
+        )
 
 
+async def report_stats(period=REPORT_PERIOD):
+    while True:
+        await asyncio.sleep(period)
+        for stats in STREAM_STATS.values():
+            stats.report()
+
+
+@asynccontextmanager
+async def open_telnet(ip, port=TELNET_PORT):
+    """Context of a new TelnetStream to `ip`, closed on exit"""
+    tnet = await TelnetStream.open(ip, port)
+    try:
+        yield tnet
+    finally:
+        tnet.close()
+
+
+async def lauch_telnet(
+    awc=1, folder=None, ip=None, batch=True, ingest='text', connection=None
+):
+    """
+    Launch a telnet reading command on awc `awc`to file `file`
+    :param batch: write the lines by chunks with `BatchFileHandler`, else
+                  line by line with a logger
+    :param ingest: see `create_data_writer`, 'parquet' and 'arrow' imply `batch`
+    :param connection: function giving a context of a TelnetStream of the AWC,
+                       e.g. `site_pool.SitePool.telnet`, by default a new
+                       connection to `ip` each time
+    """
+    if not folder:
+        folder = Path(FOLDER)
+    if connection is None:
+        connection = partial(open_telnet, ip or get_ip(awc))
+    filename_pattern = folder / FILE_PATTERN.format(awc=awc, date='{date}')
+    stats = STREAM_STATS.setdefault(awc, StreamStats(f"AWC {awc}"))
+
+    retry_delay = 0
+    while True:
+        try:
+            async with connection() as tnet:
+                handlers = []
+                try:
+                    batch = batch or ingest != 'text'
+                    if batch:
+                        data_writer = create_data_writer(
+                            filename_pattern, header=tnet.header, ingest=ingest
+                        )
+                        handlers = [data_writer]
+                    else:
+                        data_logger = create_data_logger(
+                            filename_pattern, header=tnet.header
+                        )
+                        handlers = data_logger.handlers
+                    for h in handlers:
+                        print(f"Logging AWC {awc} in file \n{h.baseFilename}")
+
                     retry_delay = 0
+                    # idle reads while batching, to write the lines waiting
+                    idle = data_writer.chunk_delay if batch else None
                     while True:
-                        line = tnet.read_until(b'\r\n').decode().rstrip()
-                        data_logger.info(line)
-                        await asyncio.sleep(0)
-            except (
-                ConnectionResetError,
-                ConnectionRefusedError,
-                TimeoutError,
-                EOFError,
-            ) as err:
-                print(f"Connection on AWC {awc} failed: {err}")
-                print(f"-> Starting again in {retry_delay} seconds.")
-                await asyncio.sleep(retry_delay)
-                retry_delay = min((retry_delay * 2 or 0.5), 60)
-
-
-async def call_logs():
+                        lines = await tnet.read_lines(idle)
+                        if batch:
+                            data_writer.write_lines(lines)
+                        else:
+                            for line in lines:
+                                data_logger.info(line)
+                        stats.update(lines)
+                finally:
+                    for h in handlers:
+                        h.close()
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            EOFError,
+        ) as err:
+            stats.reconnections += 1
+            print(f"Connection on AWC {awc} failed: {err!r}")
+        except Exception as err:
+            # parse or write error of the handlers: the other AWCs keep logging
+            stats.reconnections += 1
+            print(f"Logging AWC {awc} failed: {err!r}")
+            traceback.print_exc()
+        print(f"-> Starting again in {retry_delay} seconds.")
+        await asyncio.sleep(retry_delay)
+        retry_delay = min((retry_delay * 2 or 0.5), 60)
+
+
+async def call_logs(*tasks, ips=None, ingest='text', pool=None, site=None):
+    """
+    Log all AWCs, `tasks` are other coroutines to run in the same loop
+    :param ips: dict of IP by AWC name, default to `IPs`
+    :param ingest: see `create_data_writer`
+    :param pool: site_pool.SitePool giving the connections to the AWCs of
+                 `site`, instead of `ips`
+    """
     loggers = dict()
-    for awc in range(1, 3):
-        loggers[awc] = lauch_telnet(awc)
-    await asyncio.gather(*loggers.values())
+    if pool is not None:
+        ips = pool.config[site]['AWC']
+    for name, ip in (IPs if ips is None else ips).items():
+        awc = name.replace('AWC', '')
+        connection = None if pool is None else partial(pool.telnet, site, name)
+        loggers[awc] = lauch_telnet(awc, ip=ip, ingest=ingest, connection=connection)
+    await asyncio.gather(*loggers.values(), report_stats(), *tasks)
+
+
+async def log_site(site, config, ingest='text'):
+    """Log the AWCs of `site` of `config`, through a SitePool"""
+    from site_pool import SitePool
+
+    pool = SitePool(config)
+    try:
+        await call_logs(ingest=ingest, pool=pool, site=site)
+    finally:
+        pool.report()
+        await pool.close()
+
 
 if __name__ == '__main__':
-    asyncio.run(call_logs())
+    # site_pool and param.yaml are in the parent folder
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from site_pool import load_config, select_site
+
+    parser = ArgumentParser(description="Log the AWCs telnet streams.")
+    parser.add_argument(
+        "--ingest",
+        dest='ingest',
+        choices=['text', 'parquet', 'arrow'],
+        default='text',
+        help="Write received lines as text, or parsed in Parquet/Arrow files",
+    )
+    parser.add_argument(
+        "--site",
+        dest='site',
+        default=None,
+        help="Site of the AWCs in param.yaml, required if several sites are configured",
+    )
+    args = parser.parse_args()
+    config = load_config()
+    site, _ = select_site(config, args.site)
+    asyncio.run(log_site(site, config, args.ingest))
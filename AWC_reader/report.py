@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+HTML reports of many AWC log files, rendered in a process pool: the overview
+and detail plots of each new or changed file, and an index page of them.
+Usage: 2Acren_read_AWC_logs.py report <folder or glob> [options]
+"""
+
+import datetime
+import glob
+import html
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+from path import Path
+
+from downsample import PIXELS
+from parallel_read import _load_reader
+
+INDEX = 'index.html'
+
+
+def log_files(source):
+    """Log files of a folder, or matching a glob pattern"""
+    if Path(source).isdir():
+        return sorted(Path(source).files('*.log'))
+    return sorted(Path(f) for f in glob.glob(source) if Path(f).isfile())
+
+
+def report_files(file, folder=None):
+    """Overview and detail HTML files of a log, next to it by default"""
+    file = Path(file)
+    folder = file.parent if folder is None else Path(folder)
+    return folder / file.stem + '.html', folder / file.stem + '_detail.html'
+
+
+def is_up_to_date(file, outputs):
+    """All `outputs` written after the last change of `file`"""
+    mtime = Path(file).mtime
+    return all(Path(o).exists() and Path(o).mtime > mtime for o in outputs)
+
+
+def render(file, outputs, engine='pandas', pixels=PIXELS, binary=True):
+    """
+    Worker writing the overview and detail plots of a log file
+    :return: number of rows plotted and duration in seconds
+    """
+    start = time.perf_counter()
+    reader = _load_reader()
+    file = Path(file)
+    data = reader.read_file_data(file, engine=engine)
+
+    rollup = reader.RollupStore()
+    rollup.update(data)
+    data_resample = reader.resample_data(rollup, data, reader.FREQ_RESAMPLE)
+    data_detail = reader.select_last_data(data, reader.detail_duration_minutes)
+    for data_plot, output, title in [
+        (data_resample, outputs[0], file.stem),
+        (data_detail, outputs[1], file.stem + '_detail'),
+    ]:
+        figure = reader.plot_df(data_plot, slider=True, pixels=pixels, binary=binary)
+        figure.update_layout(title=title)
+        if binary:
+            reader.write_html(figure, output)
+        else:
+            figure.write_html(output)
+    return len(data), time.perf_counter() - start
+
+
+def write_index(entries, file):
+    """Index page of the reports: log file, links and status of each"""
+    folder = Path(file).parent
+    rows = []
+    for entry in entries:
+        links = [
+            (
+                f'<a href="{html.escape(folder.relpathto(o))}">{name}</a>'
+                if Path(o).exists()
+                else ''
+            )
+            for o, name in zip(entry['outputs'], ['overview', 'detail'])
+        ]
+        rows.append(
+            f"<tr><td>{html.escape(entry['file'].name)}</td>"
+            f"<td>{entry['file'].size / 1e6:.1f} MB</td>"
+            f"<td>{datetime.datetime.fromtimestamp(entry['file'].mtime):%Y-%m-%d %H:%M}</td>"
+            f"<td>{links[0]}</td><td>{links[1]}</td>"
+            f"<td>{html.escape(entry['status'])}</td></tr>"
+        )
+    with open(file, 'w', encoding='utf-8') as f:
+        f.write(
+            '<html>\n<head><meta charset="utf-8" /><title>AWC reports</title></head>\n'
+            '<body>\n<h1>AWC reports</h1>\n'
+            f'<p>Updated {datetime.datetime.now():%Y-%m-%d %H:%M:%S}</p>\n'
+            '<table border="1" cellpadding="4">\n'
+            '<tr><th>Log</th><th>Size</th><th>Modified</th><th>Overview</th>'
+            '<th>Detail</th><th>Status</th></tr>\n'
+            + '\n'.join(rows)
+            + '\n</table>\n</body>\n</html>\n'
+        )
+
+
+def report(
+    source,
+    folder=None,
+    workers=None,
+    engine='pandas',
+    pixels=PIXELS,
+    binary=True,
+    force=False,
+):
+    """
+    Reports of the log files of `source`, a folder or a glob pattern, only the
+    new or changed ones rendered, in `workers` processes (all CPUs by default)
+    :param folder: folder of the reports and index, next to the logs by default
+    :param force: render the files whose reports are up to date as well
+    :return: entries of the index, with the file, its reports and status
+    """
+    files = log_files(source)
+    if not files:
+        print(f"No log file in {source}")
+        return []
+    if folder is not None:
+        Path(folder).makedirs_p()
+    entries = [
+        dict(file=f, outputs=report_files(f, folder), status='up to date')
+        for f in files
+    ]
+    todo = [e for e in entries if force or not is_up_to_date(e['file'], e['outputs'])]
+    print(
+        f"{len(todo)} of {len(entries)} log files to render, "
+        f"{len(entries) - len(todo)} up to date."
+    )
+
+    start = time.perf_counter()
+    tasks = [(e, (e['file'], e['outputs'], engine, pixels, binary)) for e in todo]
+    workers = min(workers or os.cpu_count(), len(todo))
+    if workers <= 1:
+        for entry, task in tasks:
+            _rendered(entry, partial(render, *task))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = dict((executor.submit(render, *task), e) for e, task in tasks)
+            for future in as_completed(futures):
+                _rendered(futures[future], future.result)
+    print(
+        f"{len(todo)} log files rendered in {time.perf_counter() - start:.1f} seconds "
+        f"with {max(workers, 1)} processes."
+    )
+
+    index = Path(folder if folder is not None else Path(files[0]).parent) / INDEX
+    write_index(entries, index)
+    print(f"Index written to {index}")
+    return entries
+
+
+def _rendered(entry, result):
+    """Status of `entry` from `result()`, a failed file not stopping the others"""
+    try:
+        rows, duration = result()
+    except Exception as err:
+        entry['status'] = f"error: {err}"
+        print(f"### Error rendering {entry['file']}:\n{err}")
+        return
+    entry['status'] = f"{rows} rows, rendered {datetime.datetime.now():%Y-%m-%d %H:%M}"
+    print(f"{entry['file'].name}: {rows} rows rendered in {duration:.1f} seconds.")
+
+
+def parse_args(args):
+    parser = ArgumentParser(
+        prog='2Acren_read_AWC_logs.py report',
+        description="Write the HTML plots of the new or changed AWC logs.",
+    )
+    parser.add_argument(
+        "source",
+        action="store",
+        help="Folder of the log files, or glob pattern of them (quoted)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        dest='folder',
+        default=None,
+        help="Folder of the reports and index, next to the log files if not set",
+    )
+    parser.add_argument(
+        "--workers",
+        dest='workers',
+        type=int,
+        default=None,
+        help="Number of processes rendering the files, all CPUs if not set",
+    )
+    parser.add_argument(
+        "--engine",
+        "-e",
+        dest='engine',
+        choices=['pandas', 'arrow'],
+        default='pandas',
+        help="Parser of the log files, 'arrow' for large files",
+    )
+    parser.add_argument(
+        "--pixels",
+        dest='pixels',
+        type=int,
+        default=PIXELS,
+        help="Maximum points per trace, downsampled keeping the peaks, 0 to plot all points",
+    )
+    parser.add_argument(
+        "--json_arrays",
+        dest='binary',
+        action="store_false",
+        default=True,
+        help="Writes the html files with the data as JSON lists, instead of typed arrays",
+    )
+    parser.add_argument(
+        "--force",
+        "-f",
+        dest='force',
+        action="store_true",
+        default=False,
+        help="Render all the files, even if their reports are up to date",
+    )
+    return parser.parse_args(args)
+
+
+def main(args):
+    args = parse_args(args)
+    report(
+        args.source,
+        args.folder,
+        args.workers,
+        args.engine,
+        args.pixels,
+        args.binary,
+        args.force,
+    )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
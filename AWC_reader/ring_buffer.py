@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+
+class RingBuffer:
+    """
+    Last `capacity` rows of float columns, in arrays allocated once.
+    Each row is written twice, at its position and one length further, so the
+    last rows are always a contiguous slice: `frame` returns views, without
+    copying. Appending only writes the new rows.
+    A frame returned stays valid for `slack` more appended rows, before its
+    memory is written again.
+    """
+
+    def __init__(self, capacity, columns, slack=None, tz='UTC'):
+        self.capacity = capacity
+        self.columns = pd.Index(columns)
+        self.length = capacity + (capacity if slack is None else slack)
+        self.tz = tz
+        # one contiguous row per column, each of two lengths
+        self._times = np.zeros(2 * self.length, dtype='int64')
+        self._values = np.full((len(self.columns), 2 * self.length), np.nan)
+        self.count = 0  # rows appended since the creation
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, data: pd.DataFrame):
+        """Append the rows of `data`, in time order, only its buffered columns"""
+        data = data.iloc[-self.capacity :]
+        if not len(data):
+            return
+        times = data.index.asi8  # UTC nanoseconds for time zone aware indexes
+        values = data.reindex(columns=self.columns).to_numpy(dtype=float).T
+
+        positions = (self.count + np.arange(len(data))) % self.length
+        for offset in (0, self.length):
+            self._times[positions + offset] = times
+            self._values[:, positions + offset] = values
+        self.count += len(data)
+
+    def frame(self):
+        """DataFrame of the last rows, views of the buffer"""
+        end = self.count % self.length + self.length
+        start = end - len(self)
+        times = pd.arrays.DatetimeArray(
+            self._times[start:end].view('M8[ns]'),
+            dtype=pd.DatetimeTZDtype(tz='UTC'),
+            copy=False,
+        )
+        index = pd.DatetimeIndex(times).tz_convert(self.tz)
+        return pd.DataFrame(
+            self._values[:, start:end].T, index=index, columns=self.columns, copy=False
+        )
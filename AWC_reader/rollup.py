@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pandas as pd
+
+LEVELS = ['1S', '10S', '1min', '15min']  # resolutions, finest first
+MAX_POINTS = 5000  # points per trace of the level chosen for a range
+
+
+def _aggregate(resampler):
+    """Statistics of the buckets of raw rows"""
+    return pd.concat(
+        dict(
+            sum=resampler.sum(),
+            count=resampler.count(),
+            min=resampler.min(),
+            max=resampler.max(),
+        ),
+        axis=1,
+    )
+
+
+def _combine(frame, group):
+    """Statistics of buckets merged into larger ones by `group(DataFrame)`"""
+    return pd.concat(
+        dict(
+            sum=group(frame['sum']).sum(),
+            count=group(frame['count']).sum(),
+            min=group(frame['min']).min(),
+            max=group(frame['max']).max(),
+        ),
+        axis=1,
+    )
+
+
+def envelope(minimum, maximum):
+    """
+    Min and max rows of each bucket interleaved, both at its start: plotted as
+    a vertical segment per bucket, the extremes of the raw rows are kept
+    :param minimum, maximum: DataFrames of the same buckets and columns
+    """
+    values = np.empty((2 * len(minimum), minimum.shape[1]))
+    values[0::2] = minimum.to_numpy(dtype=float)
+    values[1::2] = maximum.to_numpy(dtype=float)
+    return pd.DataFrame(values, index=minimum.index.repeat(2), columns=minimum.columns)
+
+
+def bucket_floor(time, freq):
+    """
+    Start of the bucket of `freq` of `time`, floored in UTC: no ambiguous or
+    missing local time at the DST changes
+    """
+    if time.tz is None:
+        return time.floor(freq)
+    return time.tz_convert('UTC').floor(freq).tz_convert(time.tz)
+
+
+class RollupStore:
+    """
+    Mean, min and max of each column at several resolutions, updated
+    incrementally with the new rows only.
+    Each level keeps the sum, count, min and max of its buckets, so the last
+    bucket, still incomplete, is combined with the next rows. Coarser levels
+    are computed from the updated buckets of the finer one.
+    The buckets of a level are kept in chunks, never modified: an update only
+    rewrites the open bucket at the end and appends a chunk. Chunks of similar
+    sizes are merged, so there are a few of them and each bucket is copied a
+    logarithmic number of times.
+    Empty buckets are not kept.
+    """
+
+    def __init__(self, levels=LEVELS):
+        self.levels = list(levels)
+        self.durations = [pd.Timedelta(level) for level in self.levels]
+        self._chunks = dict((level, []) for level in self.levels)
+
+    @staticmethod
+    def _tail(chunks, start):
+        """Buckets from `start`, removed from the list of `chunks`"""
+        tail = []
+        while chunks and chunks[-1].index[-1] >= start:
+            chunk = chunks.pop()
+            position = chunk.index.searchsorted(start)
+            tail.insert(0, chunk.iloc[position:])
+            if position:
+                chunks.append(chunk.iloc[:position])
+                break
+        return tail
+
+    @staticmethod
+    def _append(chunks, new):
+        """Append the buckets `new`, then merge the last chunks of similar sizes"""
+        if len(new):
+            chunks.append(new)
+        while len(chunks) > 1 and len(chunks[-2]) <= 2 * len(chunks[-1]):
+            chunks[-2:] = [pd.concat(chunks[-2:])]
+
+    def update(self, data: pd.DataFrame):
+        """
+        Add the rows of `data`, later than the rows already added. The store is
+        unchanged if it raises, so the same rows can be added again.
+        """
+        if not len(data):
+            return
+        # lists of chunks updated, then replacing the ones of the store
+        chunks = dict((level, list(c)) for level, c in self._chunks.items())
+        data = data.select_dtypes('number')
+        start = data.index[0]
+        new = _aggregate(data.resample(self.levels[0]))
+        new = new[new['count'].max(axis=1) > 0]
+        if not len(new):
+            return
+        # open bucket of the finest level, combined with the new rows
+        overlap = self._tail(chunks[self.levels[0]], new.index[0])
+        if overlap:
+            new = _combine(
+                pd.concat(overlap + [new]), lambda frame: frame.groupby(level=0)
+            )
+        self._append(chunks[self.levels[0]], new)
+
+        for finer, level in zip(self.levels[:-1], self.levels[1:]):
+            # buckets of the coarser level touched by the new rows, recomputed
+            # from the buckets of the finer one, at most one coarse bucket
+            bucket_start = bucket_floor(start, level)
+            touched = [
+                chunk.loc[bucket_start:]
+                for chunk in chunks[finer]
+                if chunk.index[-1] >= bucket_start
+            ]
+            new = _combine(pd.concat(touched), lambda frame: frame.resample(level))
+            new = new[new['count'].max(axis=1) > 0]
+            self._tail(chunks[level], bucket_start)
+            self._append(chunks[level], new)
+        self._chunks = chunks
+
+    def snapshot(self):
+        """
+        Store of the current buckets, not changed by later updates: the chunks of
+        the levels are replaced by `update`, never modified
+        """
+        store = RollupStore(self.levels)
+        store._chunks = dict((level, list(c)) for level, c in self._chunks.items())
+        return store
+
+    def get(self, level, stat='mean', start=None, end=None):
+        """
+        DataFrame of `stat` ('mean', 'min' or 'max') of the columns, indexed by
+        the start of the buckets of `level`, or 'envelope' for both the min and
+        max rows of each bucket
+        """
+        chunks = [
+            chunk
+            for chunk in self._chunks[level]
+            if (start is None or chunk.index[-1] >= start)
+            and (end is None or chunk.index[0] <= end)
+        ]
+        if not chunks:
+            return pd.DataFrame()
+        frame = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+        frame = frame.loc[start:end]
+        if stat == 'mean':
+            return frame['sum'] / frame['count'].where(frame['count'] > 0)
+        if stat == 'envelope':
+            return envelope(frame['min'], frame['max'])
+        return frame[stat].copy()
+
+    def level_for(self, start=None, end=None, max_points=MAX_POINTS):
+        """
+        Finest level with at most `max_points` buckets between `start` and `end`
+        (by default the whole data), else the coarsest one
+        """
+        chunks = self._chunks[self.levels[0]]
+        if not chunks:
+            return self.levels[-1]
+        start = chunks[0].index[0] if start is None else start
+        end = chunks[-1].index[-1] if end is None else end
+        for level, duration in zip(self.levels, self.durations):
+            if (end - start) / duration <= max_points:
+                return level
+        return self.levels[-1]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Figures with their arrays encoded as base64 typed arrays, instead of JSON lists
+of numbers and date strings: float32 y values and x values as epoch ms.
+The arrays are the {'dtype', 'bdata'} objects of the newer plotly.js versions,
+decoded here by DECODE_JS for the plotly.js of the pinned plotly and dash.
+"""
+
+import base64
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+import plotly
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+X_DTYPE = 'f8'  # epoch ms do not fit in float32
+Y_DTYPE = 'f4'
+
+# JavaScript decoding of a payload: typed arrays, shared arrays referenced once
+DECODE_JS = """
+function decodeArray(array) {
+    var types = {
+        f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+        i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array
+    };
+    var bytes = atob(array.bdata);
+    var buffer = new Uint8Array(bytes.length);
+    for (var i = 0; i < bytes.length; i++) {
+        buffer[i] = bytes.charCodeAt(i);
+    }
+    return new types[array.dtype](buffer.buffer);
+}
+function decodeValue(value, shared) {
+    if (Array.isArray(value)) {
+        return value.map(function (v) { return decodeValue(v, shared); });
+    }
+    if (value === null || typeof value !== 'object') {
+        return value;
+    }
+    if (typeof value.bdata === 'string') {
+        return decodeArray(value);
+    }
+    var keys = Object.keys(value);
+    if (keys.length === 1 && keys[0] === 'shared') {
+        return shared[value.shared];
+    }
+    var decoded = {};
+    keys.forEach(function (k) { decoded[k] = decodeValue(value[k], shared); });
+    return decoded;
+}
+function decodePayload(payload) {
+    if (payload === null || payload === undefined) {
+        return window.dash_clientside ? window.dash_clientside.no_update : null;
+    }
+    return decodeValue(payload.value, (payload.shared || []).map(decodeArray));
+}
+"""
+
+# Dash clientside callback of a store of a payload, to a property of a graph
+CLIENTSIDE_DECODE = 'function (payload) {%s\n    return decodePayload(payload);\n}' % (
+    DECODE_JS
+)
+
+HTML = """<html>
+<head><meta charset="utf-8" /></head>
+<body>
+    <div>
+        <script type="text/javascript">window.PlotlyConfig = {{MathJaxConfig: 'local'}};</script>
+        {plotlyjs}
+        <div id="{div_id}" class="plotly-graph-div" style="height:100%; width:100%;"></div>
+        <script type="text/javascript">{decode_js}
+            var figure = decodePayload({payload});
+            Plotly.newPlot("{div_id}", figure.data, figure.layout, {{"responsive": true}});
+        </script>
+    </div>
+</body>
+</html>
+"""
+
+
+def epoch_ms(index):
+    """
+    Times as float ms since the epoch of their wall time, as plotly shows the
+    dates of a time zone aware index
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.asi8 / 1e6
+
+
+def encode_array(values, dtype):
+    """base64 typed array of `values`"""
+    values = np.ascontiguousarray(values, dtype='<' + dtype)
+    return dict(dtype=dtype, bdata=base64.b64encode(values).decode('ascii'))
+
+
+class _Encoder:
+    """Arrays encoded once, the x arrays equal to a previous one shared"""
+
+    def __init__(self, shared_x=True):
+        self.shared_x = shared_x
+        self.shared = []
+        self._x = []  # arrays of `shared`
+
+    def x(self, values):
+        if not isinstance(values, np.ndarray) or values.dtype.kind != 'f':
+            values = epoch_ms(values)
+        if not self.shared_x:
+            return encode_array(values, X_DTYPE)
+        for i, previous in enumerate(self._x):
+            if np.array_equal(previous, values):
+                return dict(shared=i)
+        self._x.append(values)
+        self.shared.append(encode_array(values, X_DTYPE))
+        return dict(shared=len(self.shared) - 1)
+
+    def y(self, values):
+        return encode_array(values, Y_DTYPE)
+
+    def trace(self, trace):
+        trace = dict(trace)
+        for key in ['x', 'y']:
+            if trace.get(key) is not None:
+                trace[key] = getattr(self, key)(trace[key])
+        return trace
+
+    def payload(self, value):
+        return dict(value=value, shared=self.shared)
+
+
+def figure_payload(figure, shared_x=True):
+    """
+    JSON serializable payload of `figure`, a plotly Figure or its dict, with its
+    x and y arrays encoded
+    :param shared_x: x arrays equal to a previous one sent once
+    """
+    if isinstance(figure, plotly.basedatatypes.BaseFigure):
+        figure = figure.to_plotly_json()
+    encoder = _Encoder(shared_x)
+    data = [encoder.trace(trace) for trace in figure['data']]
+    layout = dict(figure.get('layout', {}))
+    xaxis = dict(layout.get('xaxis', {}), type='date')  # x sent as numbers
+    return encoder.payload(dict(data=data, layout=dict(layout, xaxis=xaxis)))
+
+
+def extend_payload(update, indices, max_points=None, shared_x=True):
+    """Payload of the `extendData` of a dcc.Graph, with its arrays encoded"""
+    encoder = _Encoder(shared_x)
+    update = dict(
+        x=[encoder.x(x) for x in update['x']], y=[encoder.y(y) for y in update['y']]
+    )
+    if max_points:
+        return encoder.payload([update, indices, max_points])
+    return encoder.payload([update, indices])
+
+
+def write_html(figure, file, shared_x=True, include_plotlyjs=True):
+    """
+    HTML file of `figure`, decoding its typed arrays before plotting it
+    :param include_plotlyjs: True to embed plotly.js, 'cdn' to load it
+    """
+    if include_plotlyjs == 'cdn':
+        plotlyjs = (
+            '<script src="https://cdn.plot.ly/plotly-%s.min.js"></script>'
+            % get_plotlyjs_version()
+        )
+    elif include_plotlyjs:
+        plotlyjs = '<script type="text/javascript">%s</script>' % get_plotlyjs()
+    else:
+        plotlyjs = ''
+    payload = json.dumps(
+        figure_payload(figure, shared_x), cls=plotly.utils.PlotlyJSONEncoder
+    )
+    with open(file, 'w', encoding='utf-8') as f:
+        f.write(
+            HTML.format(
+                plotlyjs=plotlyjs,
+                div_id=str(uuid.uuid4()),
+                decode_js=DECODE_JS,
+                payload=payload,
+            )
+        )
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import time
+
+from TeslaModbus import TSC_connector
+
+# Maximum age of cached values in seconds, by freshness policy
+TTL = dict(static=float('inf'), slow=60, fast=0)
+
+# Freshness policy by field of TSC_connector.ADDRESS, 'fast' if not set
+POLICY = dict(
+    full_pack_energy='slow',
+    Number_Available_Megapacks='slow',
+    real_power_mode='slow',
+    always_active='slow',
+    peak_power_mode='slow',
+    reactive_active_priority='slow',
+    reactive_power_mode='slow',
+    P_up='slow',
+    P_down='slow',
+    Q_up='slow',
+    Q_down='slow',
+)
+
+
+class TSC_cache:
+    """
+    Cache of TSC values, read again only when older than the TTL of their
+    freshness policy ('static', 'slow' or 'fast').
+    Subscribers only receive the values changed since their last poll.
+    """
+
+    def __init__(self, connector: TSC_connector, policy=None, ttl=None):
+        self.connector = connector
+        self.policy = dict(POLICY, **(policy or dict()))
+        self.ttl = dict(TTL, **(ttl or dict()))
+        self._values = dict()
+        self._read_times = dict()
+        self._subscribers = dict()
+        self.stats = dict(hits=0, misses=0, reads=0)
+
+    def _max_age(self, name):
+        return self.ttl[self.policy.get(name, 'fast')]
+
+    def _is_fresh(self, name, now):
+        if name not in self._values:
+            return False
+        return now - self._read_times[name] < self._max_age(name)
+
+    def get_many(self, names=None):
+        """Values of `names`, reading only the stale ones in a single `read_many`"""
+        names = self.connector._valid_names(names)
+        now = time.monotonic()
+        stale = [name for name in names if not self._is_fresh(name, now)]
+        self.stats['hits'] += len(names) - len(stale)
+        self.stats['misses'] += len(stale)
+
+        if stale:
+            self.stats['reads'] += 1
+            values = self.connector.read_many(stale)
+            now = time.monotonic()
+            for name, value in values.items():
+                self._values[name] = value
+                self._read_times[name] = now
+        return dict((name, self._values[name]) for name in names)
+
+    def get(self, name):
+        return self.get_many([name]).get(name)
+
+    def invalidate(self, names=None):
+        """Force the next reading of `names`, or of all values"""
+        for name in list(self._values) if names is None else names:
+            self._values.pop(name, None)
+            self._read_times.pop(name, None)
+
+    def write_many(self, values: dict, verify=False):
+        """Write with `TSC_connector.write_many`, and invalidate the written values"""
+        success = self.connector.write_many(values, verify)
+        self.invalidate(success)
+        return success
+
+    def subscribe(self, callback, names=None):
+        """
+        Register `callback(changes: dict)`, called by `poll` with the values of
+        `names` changed since its last call (all values on the first call)
+        :return: key for `unsubscribe`
+        """
+        key = object()
+        self._subscribers[key] = (callback, self.connector._valid_names(names), dict())
+        return key
+
+    def unsubscribe(self, key):
+        self._subscribers.pop(key, None)
+
+    def poll(self):
+        """Read the stale values of all subscriptions and publish the changes"""
+        names = list(
+            dict.fromkeys(
+                name
+                for callback, sub_names, last in self._subscribers.values()
+                for name in sub_names
+            )
+        )
+        if not names:
+            return
+        values = self.get_many(names)
+
+        for callback, sub_names, last in list(self._subscribers.values()):
+            changes = dict(
+                (name, values[name])
+                for name in sub_names
+                if name not in last or last[name] != values[name]
+            )
+            if changes:
+                last.update(changes)
+                callback(changes)
+
+
+if __name__ == '__main__':
+    cache = TSC_cache(TSC_connector())
+    cache.subscribe(print)
+    try:
+        while True:
+            cache.poll()
+            time.sleep(1)
+    finally:
+        cache.connector.close()
+        print(cache.stats)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import asyncio
+import datetime
+import math
+import os
+import sys
+from argparse import ArgumentParser
+from functools import partial
+
+from path import Path
+from pymodbus.client.base import ConnectionException
+
+from site_pool import SitePool, load_config, select_site
+from TeslaModbus import AsyncTSC_connector
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AWC_reader'))
+from read_telnet import FOLDER, call_logs, create_data_logger
+
+FILE_PATTERN = "{date}_TSC{site}.log"
+DATEFORMAT_ROW = '%d/%m/%Y %H:%M:%S.%f'  # same day first order as AWC logs
+
+NAMES = [
+    'energy_remaining',
+    'P_setpoint',
+    'Q_setpoint',
+    'P_up',
+    'P_down',
+    'Q_up',
+    'Q_down',
+    'Number_Available_Megapacks',
+]
+
+MIN_PERIOD = 0.1  # seconds
+REPORT_PERIOD = 60  # seconds
+
+
+class TSC_poller:
+    """
+    Sample TSC registers at a fixed rate and log them in the same rotating
+    files as the AWC telnet readers.
+    Sampling times are computed from the start time, so they do not drift with
+    the reading latency. Deadlines already passed are skipped and counted.
+    Each poll takes a connector from `connection`, e.g. a SitePool.modbus, a
+    failed connector being closed by the pool and a new one opened on retry.
+    """
+
+    MAX_RETRY_DELAY = AsyncTSC_connector.MAX_RETRY_DELAY
+
+    def __init__(self, connection, names=NAMES, period=1, folder=None, site=1):
+        """
+        :param connection: function returning an async context giving a
+                           connected AsyncTSC_connector
+        """
+        if period < MIN_PERIOD:
+            raise ValueError(f"Polling period must be at least {MIN_PERIOD} s")
+        self.connection = connection
+        self.names = AsyncTSC_connector._valid_names(names)
+        self.period = period
+        self.folder = Path(folder or FOLDER)
+        self.site = site
+        self.header = ';'.join(['Timestamp_UTC'] + self.names)
+        self.stats = dict(
+            polls=0, missed=0, errors=0, latency_last=0, latency_max=0, latency_sum=0
+        )
+        self.retry_delay = 0
+
+    @property
+    def latency_mean(self):
+        return self.stats['latency_sum'] / max(self.stats['polls'], 1)
+
+    def report(self):
+        print(
+            f"TSC {self.site}: {self.stats['polls']} polls, "
+            f"{self.stats['missed']} missed deadlines, {self.stats['errors']} errors, "
+            f"latency last/mean/max: {self.stats['latency_last'] * 1000:.1f}/"
+            f"{self.latency_mean * 1000:.1f}/{self.stats['latency_max'] * 1000:.1f} ms"
+        )
+
+    async def wait_retry(self, err):
+        print(f"Reading TSC {self.site} failed: {err}")
+        print(f"-> Starting again in {self.retry_delay} seconds.")
+        await asyncio.sleep(self.retry_delay)
+        self.retry_delay = min((self.retry_delay * 2 or 0.5), self.MAX_RETRY_DELAY)
+
+    def _format_row(self, timestamp, values):
+        return ';'.join(
+            [timestamp.strftime(DATEFORMAT_ROW)[:-3]]
+            + [str(values[name]) for name in self.names]
+        )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        data_logger = create_data_logger(
+            self.folder / FILE_PATTERN.format(site=self.site, date='{date}'),
+            header=self.header,
+        )
+
+        start = loop.time()
+        next_report = start + REPORT_PERIOD
+        deadline = start
+        while True:
+            timestamp = datetime.datetime.utcnow()
+            poll_start = loop.time()
+            try:
+                async with self.connection() as connector:
+                    values = await connector.read_many(self.names)
+            except (ConnectionException, OSError) as err:
+                self.stats['errors'] += 1
+                await self.wait_retry(err)
+            else:
+                self.retry_delay = 0
+                data_logger.info(self._format_row(timestamp, values))
+
+                latency = loop.time() - poll_start
+                self.stats['polls'] += 1
+                self.stats['latency_last'] = latency
+                self.stats['latency_sum'] += latency
+                self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+
+            now = loop.time()
+            if now >= next_report:
+                self.report()
+                next_report += REPORT_PERIOD * math.ceil(
+                    (now - next_report) / REPORT_PERIOD + 1e-9
+                )
+
+            # next deadline on the grid start + k * period, after now
+            deadline += self.period
+            if now > deadline:
+                missed = math.ceil((now - deadline) / self.period)
+                self.stats['missed'] += missed
+                deadline += missed * self.period
+            await asyncio.sleep(deadline - now)
+
+
+def parse_args(args):
+    parser = ArgumentParser(description="Log TSC registers periodically.")
+    parser.add_argument(
+        "--ip", dest='ip', default=None, help="TSC address, default from param.yaml"
+    )
+    parser.add_argument(
+        "--port",
+        dest='port',
+        type=int,
+        default=None,
+        help="TSC Modbus port, default from param.yaml",
+    )
+    parser.add_argument(
+        "--period",
+        dest='period',
+        type=float,
+        default=1,
+        help=f"Sampling period in seconds, at least {MIN_PERIOD}",
+    )
+    parser.add_argument(
+        "--names",
+        dest='names',
+        nargs='+',
+        default=NAMES,
+        help="Registers to log, from TSC_connector.ADDRESS",
+    )
+    parser.add_argument("--folder", dest='folder', default=None, help="Log folder")
+    parser.add_argument(
+        "--site",
+        dest='site',
+        default=None,
+        help="Site name in files, and in param.yaml for its TSC and AWCs, "
+        "required if several sites are configured",
+    )
+    parser.add_argument(
+        "--awc",
+        dest='awc',
+        action="store_true",
+        default=None,
+        help="Log the AWCs telnet streams in the same process",
+    )
+    return parser.parse_args(args)
+
+
+async def main(args):
+    config = load_config()
+    site_name, site = select_site(config, args.site)
+    if args.ip:
+        site['modbus_TSC']['IP'] = args.ip
+    if args.port:
+        site['modbus_TSC']['port'] = args.port
+
+    pool = SitePool(config)
+    poller = TSC_poller(
+        partial(pool.modbus, site_name),
+        names=args.names,
+        period=args.period,
+        folder=args.folder,
+        site=site_name,
+    )
+    try:
+        if args.awc:
+            await call_logs(poller.run(), pool=pool, site=site_name)
+        else:
+            await poller.run()
+    finally:
+        poller.report()
+        pool.report()
+        await pool.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args(sys.argv[1:])))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+import asyncio
+import random
+import struct
+import sys
+from argparse import ArgumentParser
+
+from TeslaModbus import RegisterCodec, TSC_connector
+
+MBAP = struct.Struct('>HHHB')  # transaction, protocol, length, unit
+NB_REGISTERS = 1 << 16
+
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_REGISTERS = 16
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+
+
+class TSC_simulator:
+    """
+    Local Modbus TCP server of the TSC_connector.ADDRESS map, with a simple
+    site model: P and Q follow their setpoints within the ramps, and the
+    remaining energy drains with P.
+    Holding and input registers are the same memory, so written setpoints are
+    read back. Latency and packet loss can be injected on every request.
+    """
+
+    def __init__(
+        self,
+        latency=0,
+        jitter=0,
+        loss=0,
+        dt=0.1,
+        nb_megapacks=20,
+        megapack_energy=3e6,  # Wh
+        ramp=1e5,  # W/s
+        seed=None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.dt = dt
+        self.random = random.Random(seed)
+
+        self.registers = [0] * NB_REGISTERS
+        self.codec = RegisterCodec(TSC_connector.ADDRESS)
+        self.P = 0  # W
+        self.Q = 0  # VAr
+        self.energy = 0  # Wh, with the fractions lost in the register
+
+        full_pack_energy = int(nb_megapacks * megapack_energy)
+        self.set('full_pack_energy', full_pack_energy)
+        self.energy = full_pack_energy / 2
+        self.set('energy_remaining', round(self.energy))
+        self.set('Number_Available_Megapacks', nb_megapacks)
+        self.set('always_active', 1)
+        for name in TSC_connector.ramps_names:
+            self.set(name, int(ramp))
+
+        self.stats = dict(requests=0, dropped=0, errors=0, connections=0)
+
+    def get(self, name):
+        address, type = TSC_connector.ADDRESS[name].values()
+        nb_registers = TSC_connector.NB_REGISTERS[type]
+        return self.codec.decode(self.registers[address : address + nb_registers], type)
+
+    def set(self, name, value):
+        address, type = TSC_connector.ADDRESS[name].values()
+        registers = self.codec.encode(value, type)
+        self.registers[address : address + len(registers)] = registers
+
+    @staticmethod
+    def _follow(value, target, up, down, dt):
+        if target > value:
+            return min(target, value + abs(up) * dt)
+        return max(target, value - abs(down) * dt)
+
+    def step(self, dt):
+        """Update the site model for `dt` seconds"""
+        full_pack_energy = self.get('full_pack_energy')
+        if self.get('energy_remaining') != round(self.energy):
+            # register written by a client
+            self.energy = self.get('energy_remaining')
+        energy = self.energy
+        P_setpoint = self.get('P_setpoint')
+        # no discharge when empty, no charge when full
+        if (energy <= 0 and P_setpoint > 0) or (
+            energy >= full_pack_energy and P_setpoint < 0
+        ):
+            P_setpoint = 0
+
+        self.P = self._follow(
+            self.P, P_setpoint, self.get('P_up'), self.get('P_down'), dt
+        )
+        self.Q = self._follow(
+            self.Q,
+            self.get('Q_setpoint'),
+            self.get('Q_up'),
+            self.get('Q_down'),
+            dt,
+        )
+        energy -= self.P * dt / 3600
+        self.energy = min(max(energy, 0), full_pack_energy)
+        self.set('energy_remaining', round(self.energy))
+
+    async def run_model(self):
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while True:
+            await asyncio.sleep(self.dt)
+            now = loop.time()
+            self.step(now - last)
+            last = now
+
+    def _process(self, pdu):
+        """Response PDU of a request PDU"""
+        function = pdu[0]
+        if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            address, count = struct.unpack_from('>HH', pdu, 1)
+            if not 1 <= count <= TSC_connector.MAX_REGISTERS:
+                return bytes([function | 0x80, ILLEGAL_ADDRESS])
+            if address + count > NB_REGISTERS:
+                return bytes([function | 0x80, ILLEGAL_ADDRESS])
+            registers = self.registers[address : address + count]
+            return struct.pack(f'>BB{count}H', function, 2 * count, *registers)
+        elif function == WRITE_SINGLE_REGISTER:
+            address, value = struct.unpack_from('>HH', pdu, 1)
+            self.registers[address] = value
+            return pdu[:5]
+        elif function == WRITE_MULTIPLE_REGISTERS:
+            address, count, _ = struct.unpack_from('>HHB', pdu, 1)
+            if address + count > NB_REGISTERS:
+                return bytes([function | 0x80, ILLEGAL_ADDRESS])
+            self.registers[address : address + count] = struct.unpack_from(
+                f'>{count}H', pdu, 6
+            )
+            return pdu[:5]
+        return bytes([function | 0x80, ILLEGAL_FUNCTION])
+
+    async def _respond(self, writer, transaction, unit, pdu):
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        response = self._process(pdu)
+        if response[0] & 0x80:
+            self.stats['errors'] += 1
+        writer.write(MBAP.pack(transaction, 0, len(response) + 1, unit) + response)
+
+    async def handle(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                transaction, protocol, length, unit = MBAP.unpack(
+                    await reader.readexactly(MBAP.size)
+                )
+                pdu = await reader.readexactly(length - 1)
+                self.stats['requests'] += 1
+                if self.random.random() < self.loss:
+                    self.stats['dropped'] += 1
+                    continue
+                asyncio.ensure_future(self._respond(writer, transaction, unit, pdu))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=11502, started=None):
+        """Serve forever, `started` is an optional event set once listening"""
+        server = await asyncio.start_server(self.handle, host, port)
+        if started is not None:
+            started.set()
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run_model())
+
+
+def parse_args(args):
+    parser = ArgumentParser(description="Simulate a TSC in Modbus TCP.")
+    parser.add_argument("--host", dest='host', default='127.0.0.1')
+    parser.add_argument("--port", dest='port', type=int, default=11502)
+    parser.add_argument(
+        "--latency", dest='latency', type=float, default=0, help="Seconds"
+    )
+    parser.add_argument(
+        "--jitter", dest='jitter', type=float, default=0, help="Seconds"
+    )
+    parser.add_argument(
+        "--loss", dest='loss', type=float, default=0, help="Ratio of dropped requests"
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    simulator = TSC_simulator(latency=args.latency, jitter=args.jitter, loss=args.loss)
+    print(f"Simulating TSC on {args.host}:{args.port}")
+    try:
+        asyncio.run(simulator.serve(args.host, args.port))
+    finally:
+        print(simulator.stats)
@@ -2,16 +2,142 @@
 # http://riptideio.github.io/pymodbus/
 
 # from pymodbus.client.sync import ModbusTcpClient
-from pymodbus.client.tcp import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder, BinaryPayloadBuilder
+import asyncio
+import struct
+from collections import namedtuple
+from operator import itemgetter
+
+from pymodbus.client.tcp import AsyncModbusTcpClient, ModbusTcpClient
 from pymodbus.client.base import ConnectionException
 from pymodbus.constants import Endian
 
 # client = ModbusTcpClient('127.0.0.1', port=11502, timeout=5)
 # client.connect()
 
-class TSC_connector:
-    """Simple interface to TSC in Modbus TCP"""
+
+class RegisterCodec:
+    """
+    Encoder/decoder of Modbus registers compiled once in `struct.Struct` formats.
+    Byte and word orders have the meaning of pymodbus' BinaryPayloadDecoder:
+    registers are packed with the right byte order so that every field of a
+    block is unpacked at once with a standard struct format.
+    """
+
+    FORMATS = dict(int32='i', uint32='I', int16='h', uint16='H', bool='H')
+    NB_REGISTERS = dict(int32=2, uint32=2, int16=1, uint16=1, bool=1, str16=8, str32=16)
+
+    def __init__(self, address_map, byteorder=Endian.Big, wordorder=Endian.Big):
+        self.address_map = address_map
+        # byte order of the registers in the buffer, and of the values in it
+        self._register_order = Endian.Big if byteorder == wordorder else Endian.Little
+        self._value_order = wordorder
+        self._types = dict()
+        self._spans = dict()
+
+    def _format(self, type):
+        if type in self.FORMATS:
+            return self.FORMATS[type]
+        elif 'str' in type:
+            if self._register_order != Endian.Big:
+                raise TypeError("Strings are only decoded in big endian words")
+            return f"{2 * self.NB_REGISTERS[type]}s"
+        raise TypeError(f"Unknown type for Modbus register: {type}")
+
+    def _type_codec(self, type):
+        """Compiled (value struct, registers struct) of a type"""
+        if type not in self._types:
+            nb_registers = self.NB_REGISTERS[type]
+            self._types[type] = (
+                struct.Struct(self._value_order + self._format(type)),
+                struct.Struct(f"{self._register_order}{nb_registers}H"),
+            )
+        return self._types[type]
+
+    def _span_codec(self, start, count, names):
+        """Compiled (registers struct, values struct, record, getter, has_str) of a span"""
+        key = (start, count, names)
+        if key not in self._spans:
+            # fields sharing the same registers are decoded once
+            slots = sorted(
+                set(
+                    (self.address_map[n]['address'], self.address_map[n]['type'])
+                    for n in names
+                )
+            )
+            fmt = self._value_order
+            position = start
+            for address, type in slots:
+                if address < position:
+                    raise ValueError(f"Overlapping fields at address {address}")
+                fmt += 'x' * 2 * (address - position) + self._format(type)
+                position = address + self.NB_REGISTERS[type]
+            fmt += 'x' * 2 * (start + count - position)
+
+            indexes = [
+                slots.index(
+                    (self.address_map[n]['address'], self.address_map[n]['type'])
+                )
+                for n in names
+            ]
+            self._spans[key] = (
+                struct.Struct(f"{self._register_order}{count}H"),
+                struct.Struct(fmt),
+                namedtuple('Record', names),
+                None if indexes == list(range(len(slots))) else itemgetter(*indexes),
+                any('str' in type for address, type in slots),
+            )
+        return self._spans[key]
+
+    @staticmethod
+    def _clean(value):
+        if isinstance(value, bytes):
+            return value.decode().rstrip('x\00')
+        return value
+
+    def decode(self, registers, type):
+        """Decode a value of type `type` from the registers of its field"""
+        value_struct, registers_struct = self._type_codec(type)
+        return self._clean(value_struct.unpack(registers_struct.pack(*registers))[0])
+
+    def encode(self, value, type):
+        """Encode a value of type `type` in a list of registers"""
+        value_struct, registers_struct = self._type_codec(type)
+        if isinstance(value, str):
+            value = value.encode()
+        return list(registers_struct.unpack(value_struct.pack(value)))
+
+    def encode_span(self, start, count, names, values):
+        """
+        Encode fields `names` without gap between them from `start`
+        :param values: values of fields `names`, in the same order
+        :return: list of registers
+        """
+        registers_struct, values_struct, *_ = self._span_codec(start, count, names)
+        values = [v.encode() if isinstance(v, str) else v for v in values]
+        return list(registers_struct.unpack(values_struct.pack(*values)))
+
+    def decode_span(self, start, registers, names):
+        """
+        Decode fields `names` from the registers read from `start`
+        :param names: tuple of names from the address map
+        :return: record (namedtuple) of values
+        """
+        registers_struct, values_struct, record, getter, has_str = self._span_codec(
+            start, len(registers), names
+        )
+        values = values_struct.unpack_from(registers_struct.pack(*registers))
+        if getter:
+            values = getter(values)
+        if has_str:
+            values = [self._clean(v) for v in values]
+        return record._make(values)
+
+
+class TSC_base:
+    """
+    ADDRESS map of the TSC, with the planning of the requests and the codec of
+    the registers, common to the sync and asyncio connectors
+    """
 
     ADDRESS = dict(
         P_up=dict(address=1024, type='int32'),
@@ -38,9 +164,147 @@ class TSC_connector:
         uint32=dict(number=32, signed=False),
         uint16=dict(number=16, signed=False),
     )
+    NB_REGISTERS = RegisterCodec.NB_REGISTERS
+
+    MAX_REGISTERS = 125  # Modbus limit for a single read request
+    MERGE_GAP = 4  # unused registers allowed inside a single read request
+
+    def __init__(self, merge_gap=None):
+        self.merge_gap = self.MERGE_GAP if merge_gap is None else merge_gap
+        self.codec = RegisterCodec(self.ADDRESS)
+
+    @classmethod
+    def from_config(cls, site=None, config=None, **kwargs):
+        """
+        Connector of the TSC of `site` in param.yaml, the only site by default
+        :param config: sites of `site_pool.load_config`, read from param.yaml if
+                       not given
+        """
+        from site_pool import load_config, select_site
+
+        name, site = select_site(load_config() if config is None else config, site)
+        param = site['modbus_TSC']
+        return cls(param['IP'], port=param['port'], timeout=param['timeout'], **kwargs)
+
+    def _decode(self, registers, type):
+        """Decode a value of type `type` from the registers of its field"""
+        return self.codec.decode(registers, type)
+
+    def plan_reads(self, names, merge_gap=None):
+        """
+        Group the fields `names` in spans of contiguous registers
+        :param names: names of fields from ADDRESS
+        :param merge_gap: max number of unused registers between two fields of
+                          the same span, default to `self.merge_gap`
+        :return: list of (address, count, names) to read in a request each
+        """
+        if merge_gap is None:
+            merge_gap = self.merge_gap
+        fields = sorted(
+            (self.ADDRESS[name]['address'], name) for name in dict.fromkeys(names)
+        )
+
+        spans = []
+        for address, name in fields:
+            end = address + self.NB_REGISTERS[self.ADDRESS[name]['type']]
+            if spans:
+                start, stop, span_names = spans[-1]
+                if (
+                    address - stop <= merge_gap
+                    and max(stop, end) - start <= self.MAX_REGISTERS
+                ):
+                    spans[-1] = (start, max(stop, end), span_names + [name])
+                    continue
+            spans.append((address, end, [name]))
+        return [(start, stop - start, span_names) for start, stop, span_names in spans]
+
+    @classmethod
+    def _valid_names(cls, names, action='reading'):
+        if names is None:
+            names = list(cls.ADDRESS)
+        wrong_names = [name for name in names if name not in cls.ADDRESS]
+        if wrong_names:
+            print(
+                f"Wrong values asked for {action}: {wrong_names}, expected {cls.ADDRESS.keys()}"
+            )
+        return [name for name in names if name in cls.ADDRESS]
+
+    def _decode_span(self, start, registers, names):
+        """Decode the fields `names` from the registers read from `start`"""
+        return self.codec.decode_span(start, registers, tuple(names))._asdict()
+
+    def plan_writes(self, values: dict):
+        """
+        Encode the fields in `values` in spans of contiguous registers
+        :param values: dict of values by name from ADDRESS
+        :return: list of (address, registers, names) to write in a request each
+        """
+        names = []
+        addresses = set()
+        for name in self._valid_names(values, 'writing'):
+            address = self.ADDRESS[name]['address']
+            if address in addresses:
+                print(f"Register {address} already written, ignoring {name}")
+            else:
+                addresses.add(address)
+                names.append(name)
+
+        return [
+            (
+                start,
+                self.codec.encode_span(
+                    start, count, tuple(span_names), [values[n] for n in span_names]
+                ),
+                span_names,
+            )
+            for start, count, span_names in self.plan_reads(names, merge_gap=0)
+        ]
 
-    def __init__(self, ip='127.0.0.1', port=11502, timeout=5):
+    @staticmethod
+    def _string_type(type):
+        """str16 or str32 type of a string field of `type`"""
+        # number is 16 or 32
+        if '16' in type:
+            number = 16
+        elif '32' in type:
+            number = 32
+        else:
+            raise TypeError("Wrong type for string reading")
+        return f"str{number}"
+
+    @staticmethod
+    def _ramps_MW_minute(ramps):
+        for k, v in ramps.items():
+            ramps[k] = v * 60 / 1e6
+        return ramps
+
+    def _valid_ramps(self, ramps: dict):
+        for k in ramps:
+            if k not in self.ramps_names:
+                print(f"Wrong key for ramp update: {k}, expected {self.ramps_names}")
+        return dict((k, v) for k, v in ramps.items() if k in self.ramps_names)
+
+    @staticmethod
+    def _check_ramps(ramps, success):
+        for k, ret in success.items():
+            if not ret:
+                print(f"Error writing {k}: {ramps[k]}")
+        return success
+
+    def _check_written(self, values, success, read_values):
+        for name, value in read_values.items():
+            success[name] = value == values[name]
+            if not success[name]:
+                print(f"Error verifying {name}: {value} read, {values[name]} written")
+        return success
+
+
+class TSC_connector(TSC_base):
+    """Simple interface to TSC in Modbus TCP"""
+
+    def __init__(self, ip='127.0.0.1', port=11502, timeout=5, merge_gap=None):
         """default is 502, but using ssh port forwarding"""
+        super(TSC_connector, self).__init__(merge_gap)
         self.client = ModbusTcpClient(ip, port=port, timeout=timeout)
 
     def connect(self):
@@ -51,60 +315,46 @@ class TSC_connector:
         if self.client.connected:
             self.client.close()
 
-    def _base_reader(self, address, number):
-        """base Modbus reader and decoder"""
+    def _read_span(self, address, count):
+        """Read `count` consecutive registers in a single request"""
         self.connect()
 
-        result = self.client.read_input_registers(address, int(number / 2))
+        result = self.client.read_input_registers(address, count)
         if not result.isError():
-            return BinaryPayloadDecoder.fromRegisters(
-                result.registers,
-                byteorder=Endian.Big,
-                wordorder=Endian.Big
-                #### for int only ?
-            )
+            return result.registers
         else:
             raise ConnectionException
 
+    def read_many(self, names=None, merge_gap=None):
+        """
+        Read several fields with one request per span of contiguous registers
+        :param names: names of fields from ADDRESS, all fields if not set
+        :param merge_gap: see `plan_reads`
+        :return: dict of values by name
+        """
+        names = self._valid_names(names)
+
+        values = dict()
+        for start, count, span_names in self.plan_reads(names, merge_gap):
+            registers = self._read_span(start, count)
+            values.update(self._decode_span(start, registers, span_names))
+        return dict((name, values[name]) for name in names)
+
     def _base_writer(self, address, value, type):
         """base Modbus encoder and writer"""
 
-        builder = BinaryPayloadBuilder(byteorder=Endian.Big, wordorder=Endian.Big)
-        if 'str' in type:
-            builder.add_string(value)
-        elif type == 'int16':
-            builder.add_16bit_int(value)
-        elif type == 'uint16':
-            builder.add_16bit_uint(value)
-        elif type == 'int32':
-            builder.add_32bit_int(value)
-        elif type == 'uint32':
-            builder.add_32bit_uint(value)
-        payload = builder.build()
-
-        if not self.client.connected:
-            self.client.connect()
+        payload = self.codec.encode(value, type)
 
         self.connect()
-        result = self.client.write_registers(
-            address, payload, count=len(payload), skip_encode=True
-        )
+        result = self.client.write_registers(address, payload)
         if not result.isError():
             return True
         else:
             return False
 
     def read_string_raw(self, address, type):
-        # number is 16 or 32
-        if '16' in type:
-            number = 16
-        elif '32' in type:
-            number = 32
-        else:
-            raise TypeError("Wrong type for string reading")
-        return (
-            self._base_reader(address, number).decode_string(32).decode().rstrip('x\00')
-        )
+        type = self._string_type(type)
+        return self._decode(self._read_span(address, self.NB_REGISTERS[type]), type)
 
     def read_type(self, address, type):
         if type == 'bool':
@@ -129,17 +379,8 @@ class TSC_connector:
 
     def read_int_raw(self, address, number, signed=False):
         # number is 16 or 32
-        decoder = self._base_reader(address, number)
-        if signed:
-            if number == 16:
-                return decoder.decode_16bit_int()
-            else:
-                return decoder.decode_32bit_int()
-        else:
-            if number == 16:
-                return decoder.decode_16bit_uint()
-            else:
-                return decoder.decode_32bit_uint()
+        type = f"{'' if signed else 'u'}int{number}"
+        return self._decode(self._read_span(address, self.NB_REGISTERS[type]), type)
 
     def read_bool(self, address):
         return self.read_int_raw(address, 16, False)
@@ -148,37 +389,213 @@ class TSC_connector:
         return self.read_int_raw(207, 32, True)
 
     def read_ramps(self):
-        return dict(
-            [
-                (k, self.read_int(self.ADDRESS[k]['address'], self.ADDRESS[k]['type']))
-                for k in self.ramps_names
-            ]
-        )
+        return self.read_many(self.ramps_names)
 
     def read_ramps_MW_minute(self):
-        ramps = self.read_ramps()
-        for k, v in ramps.items():
-            ramps[k] = v * 60 / 1e6
-        return ramps
+        return self._ramps_MW_minute(self.read_ramps())
 
     def write_registers(self, address, value, type):
         return self._base_writer(address, value, type)
 
-    def change_ramps(self, ramps: dict):
-        for k, v in ramps.items():
-            if k in self.ramps_names:
-                address = self.ADDRESS[k]['address']
-                type = self.ADDRESS[k]['type']
+    def write_many(self, values: dict, verify=False):
+        """
+        Write several fields with one request per span of contiguous registers
+        :param values: dict of values by name from ADDRESS
+        :param verify: read back the written fields, with one request per
+                       span of `plan_reads`, and compare them
+        :return: dict of success by name
+        """
+        self.connect()
+        success = dict()
+        for start, registers, span_names in self.plan_writes(values):
+            result = self.client.write_registers(start, registers)
+            success.update((name, not result.isError()) for name in span_names)
+
+        if verify:
+            written = [name for name, ok in success.items() if ok]
+            self._check_written(values, success, self.read_many(written))
+        return success
+
+    def change_ramps(self, ramps: dict, verify=False):
+        ramps = self._valid_ramps(ramps)
+        return self._check_ramps(ramps, self.write_many(ramps, verify))
+
+
+class AsyncTSC_connector(TSC_base):
+    """
+    Asyncio interface to TSC in Modbus TCP, to poll several sites in one event loop.
+    Same ADDRESS map, request planning and methods as TSC_connector, the
+    methods doing requests being coroutines.
+    """
+
+    MAX_RETRY_DELAY = 60  # seconds
+
+    def __init__(
+        self, ip='127.0.0.1', port=11502, timeout=5, merge_gap=None, name=None
+    ):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.name = name or f"{ip}:{port}"
+        super(AsyncTSC_connector, self).__init__(merge_gap)
+        self.client = None
+        self.retry_delay = 0
+
+    @property
+    def connected(self):
+        return bool(self.client and self.client.connected)
+
+    async def connect(self):
+        if not self.connected:
+            self.client = AsyncModbusTcpClient(
+                self.ip, port=self.port, timeout=self.timeout
+            )
+            try:
+                await asyncio.wait_for(self.client.connect(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+            if not self.connected:
+                await self.close()
+                raise ConnectionException(f"Failed to connect to TSC {self.name}")
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
+            self.client = None
+
+    async def _read_span(self, address, count):
+        """Read `count` consecutive registers in a single request"""
+        await self.connect()
+
+        try:
+            result = await asyncio.wait_for(
+                self.client.read_input_registers(address, count), self.timeout
+            )
+        except asyncio.TimeoutError as err:
+            await self.close()
+            raise ConnectionException(f"Timeout reading TSC {self.name}") from err
+        if not result.isError():
+            return result.registers
+        else:
+            raise ConnectionException
 
-                ret = self.write_registers(address, v, type)
-                if not ret:
-                    print(f"Error writing {k}: {v}")
-            else:
-                print(f"Wrong key for ramp update: {k}, expected {self.ramps_names}")
+    async def read_many(self, names=None, merge_gap=None):
+        """See `TSC_connector.read_many`"""
+        names = self._valid_names(names)
+
+        values = dict()
+        for start, count, span_names in self.plan_reads(names, merge_gap):
+            registers = await self._read_span(start, count)
+            values.update(self._decode_span(start, registers, span_names))
+        return dict((name, values[name]) for name in names)
+
+    async def _write_span(self, address, registers):
+        """Write consecutive registers in a single request"""
+        await self.connect()
+
+        try:
+            result = await asyncio.wait_for(
+                self.client.write_registers(address, registers), self.timeout
+            )
+        except asyncio.TimeoutError as err:
+            await self.close()
+            raise ConnectionException(f"Timeout writing TSC {self.name}") from err
+        return not result.isError()
+
+    async def _base_writer(self, address, value, type):
+        """base Modbus encoder and writer"""
+        return await self._write_span(address, self.codec.encode(value, type))
+
+    async def read_string_raw(self, address, type):
+        type = self._string_type(type)
+        return self._decode(
+            await self._read_span(address, self.NB_REGISTERS[type]), type
+        )
+
+    async def read_type(self, address, type):
+        if type == 'bool':
+            type = 'uint16'
+        if 'int' in type:
+            return await self.read_int(address, type)
+        elif 'str' in type:
+            return await self.read_string_raw(address, type)
+
+    async def read_int(self, address, type: str):
+        return await self.read_int_raw(address, **self.INT_TYPES[type])
+
+    async def read_int_raw(self, address, number, signed=False):
+        type = f"{'' if signed else 'u'}int{number}"
+        return self._decode(
+            await self._read_span(address, self.NB_REGISTERS[type]), type
+        )
+
+    async def read_bool(self, address):
+        return await self.read_int_raw(address, 16, False)
+
+    async def read_energy(self):
+        return await self.read_int_raw(207, 32, True)
+
+    async def read_ramps_MW_minute(self):
+        return self._ramps_MW_minute(await self.read_ramps())
+
+    async def write_registers(self, address, value, type):
+        return await self._base_writer(address, value, type)
+
+    async def write_many(self, values: dict, verify=False):
+        """See `TSC_connector.write_many`"""
+        success = dict()
+        for start, registers, span_names in self.plan_writes(values):
+            ok = await self._write_span(start, registers)
+            success.update((name, ok) for name in span_names)
+
+        if verify:
+            written = [name for name, ok in success.items() if ok]
+            self._check_written(values, success, await self.read_many(written))
+        return success
+
+    async def read_val(self, val: str):
+        values = await self.read_many([val])
+        return values.get(val)
+
+    async def read_ramps(self):
+        return await self.read_many(self.ramps_names)
+
+    async def change_ramps(self, ramps: dict, verify=False):
+        ramps = self._valid_ramps(ramps)
+        return self._check_ramps(ramps, await self.write_many(ramps, verify))
+
+    async def poll(self, names=None, period=1, callback=print):
+        """
+        Read `names` every `period` seconds and give the values to `callback`,
+        reconnecting with an increasing delay when the TSC does not answer
+        """
+        while True:
+            try:
+                values = await self.read_many(names)
+                self.retry_delay = 0
+                callback(self.name, values)
+                await asyncio.sleep(period)
+            except (ConnectionException, OSError) as err:
+                await self.wait_retry(err)
+
+    async def wait_retry(self, err):
+        """Close the connection and wait before the next attempt"""
+        await self.close()
+        print(f"Reading TSC {self.name} failed: {err}")
+        print(f"-> Starting again in {self.retry_delay} seconds.")
+        await asyncio.sleep(self.retry_delay)
+        self.retry_delay = min((self.retry_delay * 2 or 0.5), self.MAX_RETRY_DELAY)
+
+
+async def poll_sites(connectors, names=None, period=1, callback=print):
+    """Poll all the `connectors` concurrently, can be gathered with other tasks"""
+    await asyncio.gather(
+        *[connector.poll(names, period, callback) for connector in connectors]
+    )
 
 
 if __name__ == '__main__':
-    tsc_connector = TSC_connector()
+    tsc_connector = TSC_connector.from_config()
 
     # Number of Megapacks
     client.read_holding_registers(101, 1).getRegister(0)
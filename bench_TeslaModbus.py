@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Benchmarks of TSC_connector, on a local TSC_simulator"""
+
+import asyncio
+import random
+import statistics
+import sys
+import threading
+import time
+import timeit
+from argparse import ArgumentParser
+from contextlib import asynccontextmanager
+from functools import partial
+
+from pymodbus.client.base import ConnectionException
+from pymodbus.constants import Endian
+from pymodbus.payload import BinaryPayloadDecoder
+
+from site_pool import SitePool
+from TeslaModbus import AsyncTSC_connector, TSC_connector
+from TSC_simulator import TSC_simulator
+
+NB_POLLS = 1000
+PORT = 11602
+NAMES = [
+    'energy_remaining',
+    'P_setpoint',
+    'Q_setpoint',
+    'P_up',
+    'P_down',
+    'Q_up',
+    'Q_down',
+    'Number_Available_Megapacks',
+]
+
+
+def _payload_decode(registers, type):
+    """Decoding as done before RegisterCodec, one decoder per value"""
+    decoder = BinaryPayloadDecoder.fromRegisters(
+        registers, byteorder=Endian.Big, wordorder=Endian.Big
+    )
+    if type == 'bool':
+        type = 'uint16'
+    if 'int' in type:
+        number, signed = TSC_connector.INT_TYPES[type].values()
+        if signed:
+            if number == 16:
+                return decoder.decode_16bit_int()
+            else:
+                return decoder.decode_32bit_int()
+        else:
+            if number == 16:
+                return decoder.decode_16bit_uint()
+            else:
+                return decoder.decode_32bit_uint()
+
+
+def bench_decode(nb_polls=NB_POLLS):
+    """Decoding time of all ADDRESS fields, per `nb_polls` polls"""
+    tsc = TSC_connector()
+    names = list(tsc.ADDRESS)
+    spans = [
+        (start, [random.randrange(1 << 16) for _ in range(count)], tuple(span_names))
+        for start, count, span_names in tsc.plan_reads(names)
+    ]
+    fields = [
+        (registers[address - start : address - start + tsc.NB_REGISTERS[type]], type)
+        for start, registers, span_names in spans
+        for address, type in (tsc.ADDRESS[name].values() for name in span_names)
+    ]
+
+    def payload_fields():
+        return [_payload_decode(registers, type) for registers, type in fields]
+
+    def codec_fields():
+        return [tsc.codec.decode(registers, type) for registers, type in fields]
+
+    def codec_spans():
+        return [
+            tsc.codec.decode_span(start, registers, span_names)
+            for start, registers, span_names in spans
+        ]
+
+    assert payload_fields() == codec_fields()
+    assert codec_fields() == [v for record in codec_spans() for v in record]
+
+    print(f"Decoding {len(names)} fields in {len(spans)} spans, per {nb_polls} polls:")
+    for name, func in [
+        ('BinaryPayloadDecoder per field', payload_fields),
+        ('RegisterCodec per field', codec_fields),
+        ('RegisterCodec per span', codec_spans),
+    ]:
+        duration = min(timeit.repeat(func, number=nb_polls, repeat=5))
+        print(f"  {name:32s}{duration * 1000:8.1f} ms")
+
+
+def start_simulator(port=PORT, **kwargs):
+    """Run a TSC_simulator in a background thread"""
+    simulator = TSC_simulator(seed=0, **kwargs)
+    started = threading.Event()
+    threading.Thread(
+        target=asyncio.run,
+        args=(simulator.serve(port=port, started=started),),
+        daemon=True,
+    ).start()
+    started.wait()
+    return simulator
+
+
+def _report(name, latencies, errors, duration):
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p99 = percentiles[49] * 1000, percentiles[98] * 1000
+    else:
+        p50 = p99 = float('nan')
+    print(
+        f"  {name:24s}{len(latencies) / duration:10.1f} polls/s"
+        f"{p50:10.2f} ms p50{p99:10.2f} ms p99{errors:6d} errors"
+    )
+
+
+def bench_sync(read, duration):
+    latencies = []
+    errors = 0
+    stop = time.perf_counter() + duration
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        try:
+            read()
+        except ConnectionException:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+async def bench_async(connectors, duration, names=NAMES):
+    latencies = []
+    errors = 0
+
+    async def poll(connector):
+        nonlocal errors
+        stop = time.perf_counter() + duration
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                await connector.read_many(names)
+            except ConnectionException:
+                errors += 1
+                await connector.close()
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[poll(connector) for connector in connectors])
+    for connector in connectors:
+        await connector.close()
+    return latencies, errors
+
+
+def bench_reconnect(tsc, nb=20):
+    """Time of a closing, connection and first read, of a TSC_connector"""
+    latencies = []
+    errors = 0
+    for _ in range(nb):
+        start = time.perf_counter()
+        tsc.close()
+        try:
+            tsc.read_val('energy_remaining')
+        except ConnectionException:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+async def bench_async_reconnect(tsc, nb=20):
+    """Time of a closing, connection and first read, of an AsyncTSC_connector"""
+    latencies = []
+    errors = 0
+    for _ in range(nb):
+        start = time.perf_counter()
+        await tsc.close()
+        try:
+            await tsc.read_val('energy_remaining')
+        except ConnectionException:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+    await tsc.close()
+    return latencies, errors
+
+
+async def bench_pool(connections, duration, names=NAMES):
+    """Polls through `connections`, functions returning a connector context"""
+    latencies = []
+    errors = 0
+
+    async def poll(connection):
+        nonlocal errors
+        stop = time.perf_counter() + duration
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                async with connection() as connector:
+                    await connector.read_many(names)
+            except ConnectionException:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[poll(connection) for connection in connections])
+    return latencies, errors
+
+
+def _sites_config(nb_sites, port, timeout, pool_size=1):
+    modbus = dict(IP='127.0.0.1', port=port, timeout=timeout, pool_size=pool_size)
+    return dict(
+        (f"site{i}", dict(modbus_TSC=dict(modbus), AWC={})) for i in range(nb_sites)
+    )
+
+
+async def bench_pools(duration, nb_sites, timeout, port, pollers=2):
+    """
+    Polls of `pollers` tasks per site sharing a SitePool of one connection per
+    site, against a new connection per poll
+    """
+    config = _sites_config(nb_sites, port, timeout)
+
+    @asynccontextmanager
+    async def new_connection(site):
+        connector = AsyncTSC_connector.from_config(site, config)
+        try:
+            yield connector
+        finally:
+            await connector.close()
+
+    pool = SitePool(config)
+    for name, connection in [
+        ('no pool', new_connection),
+        ('site pool', pool.modbus),
+    ]:
+        connections = [partial(connection, site) for site in config] * pollers
+        _report(
+            f'{name}, {nb_sites} sites',
+            *await bench_pool(connections, duration),
+            duration,
+        )
+    stats = pool.statistics().values()
+    print(
+        "  pool: "
+        + str(
+            dict((key, sum(stat[key] for stat in stats)) for key in next(iter(stats)))
+        )
+    )
+    await pool.close()
+
+
+def bench_read_paths(duration=5, nb_sites=10, timeout=1, port=PORT, **kwargs):
+    """Polls of NAMES per second and poll latency of the reading paths"""
+    simulator = start_simulator(port, **kwargs)
+    print(
+        f"Reading {len(NAMES)} values per poll, simulator latency {simulator.latency} s, "
+        f"loss {simulator.loss}:"
+    )
+
+    tsc = TSC_connector(port=port, timeout=timeout)
+    _report(
+        'single values',
+        *bench_sync(lambda: [tsc.read_val(name) for name in NAMES], duration),
+        duration,
+    )
+    _report('batched', *bench_sync(lambda: tsc.read_many(NAMES), duration), duration)
+    latencies, errors = bench_reconnect(tsc)
+    _report('reconnect', latencies, errors, sum(latencies))
+    tsc.close()
+    latencies, errors = asyncio.run(
+        bench_async_reconnect(AsyncTSC_connector(port=port, timeout=timeout))
+    )
+    _report('async reconnect', latencies, errors, sum(latencies))
+
+    connectors = [
+        AsyncTSC_connector(port=port, timeout=timeout, name=f"site{i}")
+        for i in range(nb_sites)
+    ]
+    _report(
+        f'async, {nb_sites} sites',
+        *asyncio.run(bench_async(connectors, duration)),
+        duration,
+    )
+    asyncio.run(bench_pools(duration, nb_sites, timeout, port))
+    print(f"  simulator: {simulator.stats}")
+
+
+def parse_args(args):
+    parser = ArgumentParser(description="Benchmarks of TSC_connector.")
+    parser.add_argument("--duration", dest='duration', type=float, default=5)
+    parser.add_argument("--sites", dest='nb_sites', type=int, default=10)
+    parser.add_argument("--latency", dest='latency', type=float, default=0)
+    parser.add_argument("--jitter", dest='jitter', type=float, default=0)
+    parser.add_argument("--loss", dest='loss', type=float, default=0)
+    parser.add_argument("--timeout", dest='timeout', type=float, default=1)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    bench_decode()
+    bench_read_paths(**vars(args))
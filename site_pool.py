@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import asyncio
+import inspect
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+import yaml
+from path import Path
+from pymodbus.client.base import ConnectionException
+
+from TeslaModbus import AsyncTSC_connector
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AWC_reader'))
+from read_telnet import TELNET_PORT, TelnetStream
+
+PARAM_FILE = Path(__file__).parent / 'param.yaml'
+
+MODBUS_DEFAULT = dict(IP='127.0.0.1', port=11502, timeout=5, pool_size=1)
+
+
+def load_config(file=PARAM_FILE):
+    """
+    Read the sites from the parameter file.
+    The top level `modbus_TSC` section gives the default values of each site,
+    and is used as a site named 'default' when no `sites` section is given.
+    :return: dict by site name of dict(modbus_TSC=dict(...), AWC=dict(name=ip))
+    """
+    with open(file) as f:
+        param = yaml.safe_load(f) or dict()
+
+    modbus_default = dict(MODBUS_DEFAULT, **param.get('modbus_TSC', dict()))
+    sites = param.get('sites') or dict(default=dict())
+
+    config = dict()
+    for name, site in sites.items():
+        site = site or dict()
+        config[name] = dict(
+            modbus_TSC=dict(modbus_default, **site.get('modbus_TSC', dict())),
+            AWC=dict(site.get('AWC', dict())),
+        )
+    return config
+
+
+def select_site(config, name=None):
+    """
+    Site `name` of `config`, compared as text as YAML keys may be numbers.
+    Without `name`, the only configured site.
+    :return: site name and its dict(modbus_TSC=..., AWC=...)
+    """
+    names = ', '.join(str(n) for n in config)
+    if name is None:
+        if len(config) == 1:
+            return next(iter(config.items()))
+        raise ValueError(f"Several sites configured, choose one with --site: {names}")
+    for key, site in config.items():
+        if str(key) == str(name):
+            return key, site
+    raise ValueError(f"Site {name} is not configured, configured sites: {names}")
+
+
+async def _call(function, *args):
+    """Result of `function`, awaited if it is a coroutine function"""
+    result = function(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class ConnectionPool:
+    """
+    Pool of persistent connections to one endpoint, shared by the tasks of an
+    event loop, and created in it.
+    The most recently released connection is reused first; connections idle
+    for longer than `max_idle` seconds are checked before being handed out.
+    A connection in use when an error is raised is closed, the next task
+    opening a new one.
+    """
+
+    def __init__(self, factory, check, close, size=1, max_idle=30, timeout=None):
+        """
+        :param factory: coroutine function opening a new connection
+        :param check: function returning True if a connection is still usable,
+                      or coroutine function
+        :param close: function closing a connection, or coroutine function
+        :param size: max number of connections open at the same time
+        :param timeout: max waiting time for a free connection, in seconds
+        """
+        self.factory = factory
+        self.check = check
+        self.close_connection = close
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self._idle = []  # (connection, release time), most recent last
+        self._slots = asyncio.Semaphore(size)
+        self.stats = dict(
+            created=0, reused=0, checks=0, failed_checks=0, errors=0, in_use=0, waits=0
+        )
+
+    async def _close(self, connection):
+        try:
+            await _call(self.close_connection, connection)
+        except Exception as err:
+            print(f"Error closing {connection}: {err!r}")
+
+    async def _get(self):
+        while self._idle:
+            connection, released = self._idle.pop()
+            if time.monotonic() - released < self.max_idle:
+                self.stats['reused'] += 1
+                return connection
+            self.stats['checks'] += 1
+            if await _call(self.check, connection):
+                self.stats['reused'] += 1
+                return connection
+            self.stats['failed_checks'] += 1
+            await self._close(connection)
+        self.stats['created'] += 1
+        return await self.factory()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Context giving a connection, closed if an error is raised while in use"""
+        if self._slots.locked():
+            self.stats['waits'] += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("No free connection in pool") from None
+        connection = None
+        try:
+            connection = await self._get()
+            self.stats['in_use'] += 1
+            try:
+                yield connection
+            finally:
+                self.stats['in_use'] -= 1
+        except BaseException:
+            # also when cancelled: a request may be left half done
+            self.stats['errors'] += 1
+            if connection is not None:
+                await self._close(connection)
+            raise
+        else:
+            self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    async def check_idle(self):
+        """Check all idle connections and close the broken ones"""
+        idle, self._idle = self._idle, []
+        for connection, released in idle:
+            self.stats['checks'] += 1
+            if await _call(self.check, connection):
+                self._idle.append((connection, released))
+            else:
+                self.stats['failed_checks'] += 1
+                await self._close(connection)
+
+    async def close(self):
+        """Close the idle connections"""
+        idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            await self._close(connection)
+
+    def statistics(self):
+        return dict(self.stats, idle=len(self._idle), size=self.size)
+
+
+async def _check_modbus(connector: AsyncTSC_connector):
+    if not connector.connected:
+        return False
+    try:
+        await connector.read_val('Number_Available_Megapacks')
+    except (ConnectionException, OSError):
+        return False
+    return True
+
+
+class SitePool:
+    """
+    Pools of the Modbus TSC and AWC telnet connections of the sites of
+    param.yaml, by site name: the pollers of many sites run in one event loop
+    share persistent connections, `pool_size` per site for the TSC, instead of
+    reconnecting on each poll.
+    The pools are created on first use, in the event loop of the pollers.
+    """
+
+    def __init__(self, config=None, max_idle=30, timeout=None):
+        """
+        :param config: sites of `load_config`, read from param.yaml if not given
+        :param max_idle: seconds after which an idle connection is checked
+        :param timeout: max waiting time for a free connection, in seconds
+        """
+        self.config = load_config() if config is None else config
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._pools = dict()
+
+    def _pool(self, key, factory, check, close, size):
+        if key not in self._pools:
+            self._pools[key] = ConnectionPool(
+                factory,
+                check,
+                close,
+                size=size,
+                max_idle=self.max_idle,
+                timeout=self.timeout,
+            )
+        return self._pools[key]
+
+    def modbus(self, site):
+        """Context giving a connected AsyncTSC_connector of `site`"""
+        param = self.config[site]['modbus_TSC']
+
+        async def factory():
+            connector = AsyncTSC_connector.from_config(
+                site, self.config, name=f"{site} {param['IP']}:{param['port']}"
+            )
+            await connector.connect()
+            return connector
+
+        return self._pool(
+            (site, 'modbus_TSC'),
+            factory,
+            _check_modbus,
+            AsyncTSC_connector.close,
+            param['pool_size'],
+        ).acquire()
+
+    def telnet(self, site, awc):
+        """
+        Context giving the TelnetStream of AWC `awc` of `site`, a single one
+        per AWC
+        """
+        ip = self.config[site]['AWC'][awc]
+        return self._pool(
+            (site, awc),
+            lambda: TelnetStream.open(ip, TELNET_PORT),
+            TelnetStream.is_open,
+            TelnetStream.close,
+            1,
+        ).acquire()
+
+    async def check_idle(self):
+        for pool in list(self._pools.values()):
+            await pool.check_idle()
+
+    def statistics(self):
+        return dict((key, pool.statistics()) for key, pool in self._pools.items())
+
+    def report(self):
+        for (site, name), stats in self.statistics().items():
+            print(f"Pool {site} {name}: {stats}")
+
+    async def close(self):
+        for pool in list(self._pools.values()):
+            await pool.close()